@@ -10,6 +10,8 @@ class Settings(BaseSettings):
     openai_api_key: str
     openai_chat_model: str = "gpt-4o-mini"
     openai_image_model: str = "dall-e-3"
+    openai_max_concurrency: int = 16  # 同时进行的OpenAI请求上限（每个进程）
+    openai_max_retries: int = 5  # 429/5xx时SDK按指数退避重试的次数
     
     # LLM 服务配置
     llm_default_model: str = "gpt-4.1"
@@ -19,6 +21,8 @@ class Settings(BaseSettings):
     # 缓存配置
     llm_cache_enabled: bool = True
     llm_cache_ttl: int = 3600  # 1小时
+    llm_cache_db: str = str(Path(__file__).parent.parent / "temp" / "llm_cache.db")
+    llm_cache_max_entries: int = 1000
 
     class Config:
         env_file = str(Path(__file__).parent.parent.parent / ".env")
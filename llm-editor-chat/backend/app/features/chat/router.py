@@ -4,23 +4,14 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import json
 import asyncio
-import contextvars
 import re
 import os
 import logging
 
 from tempfile import NamedTemporaryFile
 
-# Define context variable for storing top-level intent
-current_top_intent = contextvars.ContextVar('current_top_intent', default=None)
-
-def get_current_intent():
-    """Utility function to get the current top-level intent from context.
-    
-    Returns:
-        The current top-level intent or None if not set.
-    """
-    return current_top_intent.get()
+# Top-level intent context lives in chat.state; re-exported here for backward compatibility
+from app.features.chat.state import current_top_intent, get_current_intent
 
 # 配置日志记录
 logger = logging.getLogger(__name__)
@@ -296,89 +287,97 @@ async def stream_chat(request: ChatRequest):
             
             # other treated as modify_existing
             elif (top_intent.intent_type == "modify_existing" or top_intent.intent_type == "other") and top_intent.confidence > 0.6 and request.editor_content:
-                # Get detailed modification intent description
-                modify_intent_description = await confirm_modify_intent(request.message)
-                yield f"data: {json.dumps({'type': 'thinking', 'content': f'{modify_intent_description}'})}\n\n"
-                
-                # Use DocumentPipeline to process document modification requests
-                # yield f"data: {json.dumps({'type': 'thinking', 'content': 'Detected modification request. Using document pipeline for intelligent processing...'})}\n\n"
-                
                 # Initialize DocumentPipelineService
                 pipeline_service = DocumentPipelineService.get_instance()
                 
-                # TODO: Always force pipeline usage
+                # 修改意图描述与文档处理都只依赖请求本身，两次LLM调用并发执行
+                # 直接调用处理服务，不需要保存临时文件
+                pipeline_task = asyncio.create_task(pipeline_service.process_jsonnode(request))
+                
                 try:
-                    # 直接调用处理服务，不需要保存临时文件
-                    result = await pipeline_service.process_jsonnode(request)
+                    # Get detailed modification intent description
+                    modify_intent_description = await confirm_modify_intent(request.message)
+                    yield f"data: {json.dumps({'type': 'thinking', 'content': f'{modify_intent_description}'})}\n\n"
+                
+                    # Use DocumentPipeline to process document modification requests
+                    # yield f"data: {json.dumps({'type': 'thinking', 'content': 'Detected modification request. Using document pipeline for intelligent processing...'})}\n\n"
+                
+                    # TODO: Always force pipeline usage
+                    try:
+                        result = await pipeline_task
                     
-                    if result.get("success", False):
-                        # Send success message
-                        # yield f"data: {json.dumps({'type': 'thinking', 'content': 'Document processed successfully, applying changes...'})}\n\n"
+                        if result.get("success", False):
+                            # Send success message
+                            # yield f"data: {json.dumps({'type': 'thinking', 'content': 'Document processed successfully, applying changes...'})}\n\n"
                         
-                        # Send update editor content action
-                        # Get correct action type from editor_actions.json
-                        from app.features.llm.services.router import _EDITOR_ACTIONS
+                            # Send update editor content action
+                            # Get correct action type from editor_actions.json
+                            from app.features.llm.services.router import _EDITOR_ACTIONS
                         
-                        # Get current editor content length
-                        json_update = result['result'].get('path_updates', [])
-                        json_update_str = json.dumps(json_update, ensure_ascii=False)
+                            # Get current editor content length
+                            json_update = result['result'].get('path_updates', [])
+                            json_update_str = json.dumps(json_update, ensure_ascii=False)
                         
-                        editor_content_length = len(json_update_str) if json_update_str else 0
+                            editor_content_length = len(json_update_str) if json_update_str else 0
                         
-                        # Log detailed information
-                        logger.info(f"Editor content length: {editor_content_length}")
+                            # Log detailed information
+                            logger.info(f"Editor content length: {editor_content_length}")
                         
-                        # Use from and to properties instead of start and end to match frontend expected property names
-                        # Ensure to value does not exceed actual document length
-                        action = {
-                            "type": _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text"), 
-                            "payload": {
-                                "content": json_update_str, 
-                                "from": 0, 
-                                "to": editor_content_length
+                            # Use from and to properties instead of start and end to match frontend expected property names
+                            # Ensure to value does not exceed actual document length
+                            action = {
+                                "type": _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text"), 
+                                "payload": {
+                                    "content": json_update_str, 
+                                    "from": 0, 
+                                    "to": editor_content_length
+                                }
                             }
-                        }
                         
-                        # Log action object details
-                        logger.info(f"Generated action object: {json.dumps(action)}")                            
-                        logger.info(f"Action type: {action['type']}, Content length: {len(action['payload']['content']) if 'content' in action['payload'] else 0}")
+                            # Log action object details
+                            logger.info(f"Generated action object: {json.dumps(action)}")                            
+                            logger.info(f"Action type: {action['type']}, Content length: {len(action['payload']['content']) if 'content' in action['payload'] else 0}")
                         
-                        # 生成解释性反馈
-                        explanation = 'Document updated'
-                        try:
-                            # 获取原始内容和修改后的内容
-                            original_content = request.editor_content if request.editor_content else ""
-                            modified_content = json_update_str if json_update_str else ""
-                            
                             # 生成解释性反馈
-                            explanation = await generate_modification_explanation(
-                                original_content=original_content,
-                                modified_content=modified_content,
-                                user_request=request.message
-                            )
+                            explanation = 'Document updated'
+                            try:
+                                # 获取原始内容和修改后的内容
+                                original_content = request.editor_content if request.editor_content else ""
+                                modified_content = json_update_str if json_update_str else ""
                             
-                            # 发送解释性反馈作为thinking消息
-                            explanation_msg = json.dumps({'type': 'thinking', 'content': explanation})
-                            logger.info(f"Sending explanation message: {explanation_msg}")
-                            #yield f"data: {explanation_msg}\n\n"
-                        except Exception as e:
-                            logger.error(f"Error generating explanation: {e}")
+                                # 生成解释性反馈
+                                explanation = await generate_modification_explanation(
+                                    original_content=original_content,
+                                    modified_content=modified_content,
+                                    user_request=request.message
+                                )
+                            
+                                # 发送解释性反馈作为thinking消息
+                                explanation_msg = json.dumps({'type': 'thinking', 'content': explanation})
+                                logger.info(f"Sending explanation message: {explanation_msg}")
+                                #yield f"data: {explanation_msg}\n\n"
+                            except Exception as e:
+                                logger.error(f"Error generating explanation: {e}")
                         
-                        # 准备并发送动作消息
-                        action_msg = json.dumps({'type': 'action', 'content': explanation, 'action': action})
-                        logger.info(f"Message sent to frontend: {action_msg}")
+                            # 准备并发送动作消息
+                            action_msg = json.dumps({'type': 'action', 'content': explanation, 'action': action})
+                            logger.info(f"Message sent to frontend: {action_msg}")
                         
-                        yield f"data: {action_msg}\n\n"
-                        return
-                    else:
-                        # If processing fails, log error and fallback to standard processing
-                        error_message = result.get("message", "Unknown error in document processing")
-                        logger.error(f"Document pipeline error: {error_message}")
-                        yield f"data: {json.dumps({'type': 'thinking', 'content': f'处理文档时出错: {error_message}. 回退到标准处理...'})}\n\n"
-                except Exception as e:
-                    # Capture any unhandled exceptions
-                    logger.error(f"Error in document pipeline: {str(e)}")
-                    yield f"data: {json.dumps({'type': 'thinking', 'content': f'处理文档时出错: {str(e)}. 回退到标准处理...'})}\n\n"
+                            yield f"data: {action_msg}\n\n"
+                            return
+                        else:
+                            # If processing fails, log error and fallback to standard processing
+                            error_message = result.get("message", "Unknown error in document processing")
+                            logger.error(f"Document pipeline error: {error_message}")
+                            yield f"data: {json.dumps({'type': 'thinking', 'content': f'处理文档时出错: {error_message}. 回退到标准处理...'})}\n\n"
+                    except Exception as e:
+                        # Capture any unhandled exceptions
+                        logger.error(f"Error in document pipeline: {str(e)}")
+                        yield f"data: {json.dumps({'type': 'thinking', 'content': f'处理文档时出错: {str(e)}. 回退到标准处理...'})}\n\n"
+                finally:
+                    # 客户端断开或意图描述出错时，不留下仍在运行的文档处理任务
+                    if not pipeline_task.done():
+                        pipeline_task.cancel()
                 
                 # If pipeline is not applicable or processing fails, fallback to standard LLM processing
                 yield f"data: {json.dumps({'type': 'thinking', 'content': 'Using standard LLM processing for your request...'})}\n\n"
@@ -0,0 +1,36 @@
+"""
+Per-request chat state
+
+Holds the top-level intent of the chat request being processed in a context
+variable. Kept separate from the chat router so services can import it at
+module level without creating an import cycle with the router.
+"""
+import contextvars
+
+_DEFAULT_LANG = "English"
+
+# Define context variable for storing top-level intent
+current_top_intent = contextvars.ContextVar('current_top_intent', default=None)
+
+def get_current_intent():
+    """Utility function to get the current top-level intent from context.
+    
+    Returns:
+        The current top-level intent or None if not set.
+    """
+    return current_top_intent.get()
+
+def get_current_language(default: str = _DEFAULT_LANG) -> str:
+    """Get the language detected for the current request.
+    
+    Args:
+        default: Language to use when no intent or language is available
+    
+    Returns:
+        The language from the current top-level intent's additional_info, or default.
+    """
+    top_intent = current_top_intent.get()
+    additional_info = getattr(top_intent, 'additional_info', None)
+    if isinstance(additional_info, dict):
+        return additional_info.get('language', default)
+    return default
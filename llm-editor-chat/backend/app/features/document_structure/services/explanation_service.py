@@ -7,6 +7,7 @@ import logging
 from typing import Optional
 
 from app.utils.llm_utils import generate_text
+from app.features.chat.state import get_current_language
 
 logger = logging.getLogger(__name__)
 
@@ -36,17 +37,8 @@ async def generate_modification_explanation(
     
     system_prompt = """You are a professional document revision expert. Your task is to analyze document changes and provide clear, concise explanations to help users understand the modifications and their rationale. Maintain a professional, objective tone and focus on the most important changes."""
     
-    # 读取top_intent，然后读取language设置，并把语言设置添加到system_prompt之后
-    from app.features.chat.router import get_current_intent
-    
-    # 获取当前的top_level_intent
-    top_intent = get_current_intent()
-    
-    # 默认使用中文，如果top_intent存在且有language属性，则使用该属性
-    language = "English"
-    if top_intent and hasattr(top_intent, 'additional_info') and top_intent.additional_info:
-        if isinstance(top_intent.additional_info, dict) and 'language' in top_intent.additional_info:
-            language = top_intent.additional_info['language']
+    # 读取top_intent的language设置，并把语言设置添加到system_prompt之后
+    language = get_current_language()
     
     system_prompt += f"Output in {language}."
     
@@ -1,9 +1,9 @@
 from typing import Optional, Dict, Any, Literal, Union
-import json
 import logging
 from pydantic import BaseModel, Field
 from pathlib import Path
 from app.utils.llm_utils import generate_text
+from app.utils.json_recovery import parse_llm_json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -211,46 +211,18 @@ async def identify_create_new_intent(message: str, file_path: Optional[str] = No
             response_format={"type": "json_object"}
         )
         
-        # Try to parse the JSON response
-        try:
-            intent_data = json.loads(response_content)
-            return CreateNewIntent(**intent_data)
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, try to extract JSON from the response
-            try:
-                # Try to find JSON in the response using string manipulation
-                json_start = response_content.find('{')
-                json_end = response_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_content[json_start:json_end]
-                    intent_data = json.loads(json_str)
-                    return CreateNewIntent(**intent_data)
-                else:
-                    # If no JSON found, return a default intent with low confidence
-                    return CreateNewIntent(
-                        document_type="text/plain",
-                        complexity="simple",
-                        word_count=100,
-                        confidence=0.1,
-                        additional_info={"error": "Failed to parse LLM response as JSON"}
-                    )
-            except Exception as e2:
-                # If all parsing attempts fail, return a default intent with low confidence
-                return CreateNewIntent(
-                    document_type="text/plain",
-                    complexity="simple",
-                    word_count=100,
-                    confidence=0.1,
-                    additional_info={"error": f"Failed to parse LLM response: {str(e2)}"}
-                )
-            # If all parsing attempts fail, return a default intent with low confidence
+        # Parse the JSON response
+        intent_data = parse_llm_json(response_content)
+        if not intent_data:
+            # If no JSON found, return a default intent with low confidence
             return CreateNewIntent(
                 document_type="text/plain",
                 complexity="simple",
                 word_count=100,
                 confidence=0.1,
-                additional_info={"error": f"Failed to parse LLM response: {str(e2)}"}
+                additional_info={"error": "Failed to parse LLM response as JSON"}
             )
+        return CreateNewIntent(**intent_data)
     
     except Exception as e:
         logger.error(f"Error during LLM call: {str(e)}")
@@ -0,0 +1,102 @@
+"""
+Fast-path top-level intent classification
+
+Matches trivial messages (greetings, thanks, explicit image insertion and
+file-reading requests) with precompiled patterns so they can skip the LLM
+call in identify_top_level_intent. Anything ambiguous returns None and goes
+to the LLM as before.
+"""
+import re
+from typing import Optional, Dict, Any
+
+_FASTPATH_CONFIDENCE = 0.9
+
+_CJK = re.compile(r'[一-鿿]')
+
+_GREETING = re.compile(r'^(hi|hello|hey|good (morning|afternoon|evening)|你好|您好|嗨|哈喽)[\s!！.。,，~]*$')
+_THANKS = re.compile(r'^(thanks|thank you|thx|ty|谢谢|多谢|感谢)[\s!！.。,，~]*$')
+# Image and file patterns must cover the whole message (fullmatch) so that
+# edits mentioning an existing image/file ("make the image bigger") go to the LLM.
+# A new image needs an article ("a/an/one/some"); "the/this image" is an edit.
+# Subjects that point at the document ("of the table above", "上面段落的图") need
+# the LLM for placement and context, so they never take the fast path.
+_EN_DOCUMENT_REFERENCE = (
+    r'(?![^?!.。？！]*\b(section|paragraph|table|chapter|page|document|doc|slide|text|'
+    r'above|below|here|previous|following)s?\b)'
+)
+_ZH_DOCUMENT_REFERENCE = r'(?![^，。,.？?！!]*(上面|下面|上文|下文|上述|以上|以下|这里|此处|文中|文档|段|节|章|表格))'
+_INSERT_IMAGE = re.compile(
+    r'(please\s+)?(can you\s+)?(insert|add|generate|create|draw|make)\s+(me\s+)?(an?|one|some)\s+'
+    r'(image|picture|photo|illustration|diagram|flowchart)s?'
+    r'(\s+(of|showing|about|illustrating)\s+' + _EN_DOCUMENT_REFERENCE + r'[^?!.。？！]{1,80})?[\s!.。！]*'
+    r'|(请|帮我|请帮我)?(插入|添加|生成|画)' + _ZH_DOCUMENT_REFERENCE + r'(一张|一幅|一个)?[^，。,.？?！!份篇的]{0,8}的?'
+    r'(图片|图像|插图|配图|流程图|示意图)[\s!.。！]*'
+)
+_READ_FILE = re.compile(
+    r'(please\s+)?(can you\s+)?(read|open)\s+(the\s+|my\s+|this\s+)?(file\s+)?[\w\-./ ]{1,60}\.(pdf|docx?|txt)'
+    r'(\s+and\s+(summarize|summarise|review|analyze|analyse)\s+it)?[\s!.。！]*'
+    r'|(请|帮我|请帮我)?(打开|阅读|读取)[^，。,？?！!]{1,40}?\.(pdf|docx?|txt)[\s!.。！]*'
+)
+
+_WELCOME_MESSAGES = {
+    "greeting": {
+        "english": "Hi! How can I help with your document today?",
+        "chinese": "你好！今天需要我帮你处理什么文档？",
+    },
+    "thanks": {
+        "english": "You're welcome! Let me know if there's anything else.",
+        "chinese": "不客气！还有其他需要随时告诉我。",
+    },
+    "insert_image": {
+        "english": "I'll create that image for you!",
+        "chinese": "好的！我来为您生成这张图片。",
+    },
+    "read_file": {
+        "english": "I'll read that file for you.",
+        "chinese": "好的，我来读取这个文件。",
+    },
+}
+
+
+def _build_intent(intent_type: str, kind: str, language: str) -> Dict[str, Any]:
+    """Build TopLevelIntent field data for a fast-path hit"""
+    additional_info = {
+        "conversation_history_relevance": "independent",
+        "language": language,
+        "welcome_message": _WELCOME_MESSAGES[kind][language],
+        "fastpath": True,
+    }
+    if intent_type == "question_only":
+        additional_info["question_type"] = kind
+    return {
+        "intent_type": intent_type,
+        "confidence": _FASTPATH_CONFIDENCE,
+        "additional_info": additional_info,
+    }
+
+
+def fastpath_classify(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Classify trivial messages without calling the LLM
+
+    Args:
+        message: Original user input text
+
+    Returns:
+        TopLevelIntent field data on a match, otherwise None
+    """
+    text = message.strip().lower()
+    if not text:
+        return None
+
+    language = "chinese" if _CJK.search(text) else "english"
+
+    if _GREETING.match(text):
+        return _build_intent("question_only", "greeting", language)
+    if _THANKS.match(text):
+        return _build_intent("question_only", "thanks", language)
+    if _INSERT_IMAGE.fullmatch(text):
+        return _build_intent("insert_image", "insert_image", language)
+    if _READ_FILE.fullmatch(text):
+        return _build_intent("read_file", "read_file", language)
+    return None
@@ -1,8 +1,7 @@
 from typing import Optional, Literal, Dict, Any
-import json
-import re
 from pydantic import BaseModel, Field
 from app.utils.llm_utils import generate_text
+from app.utils.json_recovery import parse_llm_json
 import logging
 
 # Configure logging
@@ -76,21 +75,11 @@ async def identify_insert_image_intent(message: str, model: str = "gpt-4o", temp
             response_format={"type": "json_object"}
         )
         
-        # Try to parse the JSON response
-        try:
-            data = json.loads(response_content)
-        except json.JSONDecodeError:
-            # If direct parsing fails, try to extract JSON using regex
-            json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-            if json_match:
-                try:
-                    data = json.loads(json_match.group(0))
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON response: {e}")
-                    return InsertImageIntent(image_type="aesthetic", confidence=0.1)
-            else:
-                logger.error(f"No JSON structure found in response: {response_content}")
-                return InsertImageIntent(image_type="aesthetic", confidence=0.1)
+        # Parse the JSON response
+        data = parse_llm_json(response_content)
+        if not data:
+            logger.error(f"No JSON structure found in response: {response_content}")
+            return InsertImageIntent(image_type="aesthetic", confidence=0.1)
         
         # Validate required fields
         if "image_type" not in data or "confidence" not in data:
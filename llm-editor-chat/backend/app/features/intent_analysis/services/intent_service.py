@@ -1,8 +1,8 @@
 from typing import Optional, Dict, Any, List, AsyncGenerator
-import json
 import logging
 from pydantic import BaseModel, Field
 from app.utils.llm_utils import generate_text
+from app.utils.json_recovery import parse_llm_json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -101,27 +101,15 @@ If the user says "Add a paragraph about renewable energy", you should return:
         )
         
         # Parse JSON response
-        try:
-            data = json.loads(response_content)
-            return DocumentIntent(**data)
-        except json.JSONDecodeError as e:
-            # Try to extract JSON from the response if direct parsing fails
-            try:
-                json_start = response_content.find('{')
-                json_end = response_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_content[json_start:json_end]
-                    data = json.loads(json_str)
-                    return DocumentIntent(**data)
-                else:
-                    raise ValueError("No valid JSON found in response")
-            except Exception as e2:
-                logger.error(f"Failed to parse JSON response: {e2}")
-                return DocumentIntent(
-                    document_type="unknown",
-                    confidence=0.0,
-                    additional_info={"error": f"JSON parsing error: {str(e2)}", "raw_response": response_content}
-                )
+        data = parse_llm_json(response_content)
+        if not data:
+            logger.error("Failed to parse JSON response: no valid JSON object found")
+            return DocumentIntent(
+                document_type="unknown",
+                confidence=0.0,
+                additional_info={"error": "JSON parsing error: no valid JSON object found", "raw_response": response_content}
+            )
+        return DocumentIntent(**data)
     except Exception as e:
         logger.error(f"Error during LLM call: {str(e)}")
         return DocumentIntent(
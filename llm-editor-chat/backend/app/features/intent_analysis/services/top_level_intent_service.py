@@ -1,7 +1,7 @@
 from typing import Optional, Dict, Any, Literal
-import json
-from pydantic import BaseModel, Field
-from app.utils.llm_utils import generate_text
+from pydantic import BaseModel, Field, TypeAdapter
+from app.utils.llm_utils import generate_structured
+from app.features.intent_analysis.services.fastpath import fastpath_classify
 
 class TopLevelIntent(BaseModel):
     """Model for top-level user intent"""
@@ -18,22 +18,15 @@ class TopLevelIntent(BaseModel):
         description="Additional intent-related information to help with sub-intent classification"
     )
 
-async def identify_top_level_intent(message: str, model: str = "gpt-4.1", temperature: float = 0.0) -> TopLevelIntent:
-    """
-    Identify the top-level intent from user messages
-    
-    Args:
-        message: Original user input text
-        model: Language model name to use
-        temperature: Temperature parameter for model generation diversity
-        
-    Returns:
-        TopLevelIntent: Identified top-level user intent
-    """
-    # 直接使用提示和手动JSON解析，不需要专门的parser
-    
-    # System prompt - Cross-intent detection approach
-    system_prompt = """You are an advanced intent recognition assistant with cross-intent detection capabilities. Your task is to analyze user requests across multiple dimensions:
+def format_top_level_intent(intent: TopLevelIntent) -> str:
+    """Feedback line shown to the user once the top-level intent is known"""
+    return f"已识别您的意图：{intent.intent_type}（置信度 {format(intent.confidence, '.2f')}）"
+
+# Reused validator for TopLevelIntent data coming back from the LLM or the fast path
+_TOP_INTENT_ADAPTER = TypeAdapter(TopLevelIntent)
+
+# System prompt - Cross-intent detection approach
+_TOP_INTENT_SYSTEM_PROMPT = """You are an advanced intent recognition assistant with cross-intent detection capabilities. Your task is to analyze user requests across multiple dimensions:
 
 1. PRIMARY TASK - INTENT CLASSIFICATION: Classify the user's request into ONE of these categories:
 
@@ -160,57 +153,47 @@ If the user says "帮我写一份简历" (Help me write a resume), you should re
   }
 }
 ```"""
-    
-    # Create format instructions
-    format_instructions = """You must return a valid JSON object containing the following fields:
+
+# Format instructions
+_FORMAT_INSTRUCTIONS = """You must return a valid JSON object containing the following fields:
 - intent_type: String identifier for the intent type, must be one of: "create_new", "modify_existing", "question_only", "insert_image", "other"
 - confidence: Your confidence in this classification, a float between 0-1
 - additional_info: An optional object containing other relevant information extracted from the user request"""
+
+# Static prefix sent ahead of the user message. It is byte-identical across requests
+# (well over 1024 tokens), so OpenAI's automatic prompt caching can reuse its prefill;
+# keep anything request-specific out of it and in the final user message.
+_TOP_INTENT_PROMPT_PREFIX = _TOP_INTENT_SYSTEM_PROMPT + "\n\n" + _FORMAT_INSTRUCTIONS
+
+async def identify_top_level_intent(message: str, model: str = "gpt-4.1", temperature: float = 0.0) -> TopLevelIntent:
+    """
+    Identify the top-level intent from user messages
     
-    # Create user prompt
-    user_prompt = f"{message}\n\n{format_instructions}"
+    Args:
+        message: Original user input text
+        model: Language model name to use
+        temperature: Temperature parameter for model generation diversity
+        
+    Returns:
+        TopLevelIntent: Identified top-level user intent
+    """
+    # Trivial messages (greetings, explicit image/file requests) skip the LLM call
+    fastpath_hit = fastpath_classify(message)
+    if fastpath_hit is not None:
+        return _TOP_INTENT_ADAPTER.validate_python(fastpath_hit)
     
     try:
-        # Get the response from the model using the unified LLM utility
-        response_content = await generate_text(
-            prompt=user_prompt,
-            system_message=system_prompt,
+        # Bind the TopLevelIntent schema as a tool so the model returns schema-valid arguments
+        intent_data = await generate_structured(
+            prompt=message,
+            schema=TopLevelIntent,
+            system_message=_TOP_INTENT_PROMPT_PREFIX,
             model=model,
-            temperature=temperature,
-            streaming=False,
-            response_format={"type": "json_object"}
+            temperature=temperature
         )
-        
-        # Parse the JSON response
-        try:
-            intent_data = json.loads(response_content)
-            return TopLevelIntent(**intent_data)
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, try to extract JSON from the response
-            try:
-                # Try to find JSON in the response using string manipulation
-                json_start = response_content.find('{')
-                json_end = response_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_content[json_start:json_end]
-                    intent_data = json.loads(json_str)
-                    return TopLevelIntent(**intent_data)
-                else:
-                    # If no JSON found, return a default intent with low confidence
-                    return TopLevelIntent(
-                        intent_type="other",
-                        confidence=0.1,
-                        additional_info={"error": "Failed to parse LLM response as JSON"}
-                    )
-            except Exception as e2:
-                # If all parsing attempts fail, return a default intent with low confidence
-                return TopLevelIntent(
-                    intent_type="other",
-                    confidence=0.1,
-                    additional_info={"error": f"Failed to parse LLM response: {str(e2)}"}
-                )
+        return _TOP_INTENT_ADAPTER.validate_python(intent_data)
     except Exception as e:
-        # If the unified LLM utility call fails, return a default intent with low confidence
+        # If the structured call or validation fails, return a default intent with low confidence
         return TopLevelIntent(
             intent_type="other",
             confidence=0.1,
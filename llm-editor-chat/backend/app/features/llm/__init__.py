@@ -1,19 +1,25 @@
 """LLM Feature Module
 
 This module provides LLM services and API endpoints for the application.
+
+Exports are resolved lazily (PEP 562) so that importing the package does not
+pull in LangChain/OpenAI or construct a service before it is first used.
 """
-# Import from new location for backward compatibility
-from app.features.llm.services import BaseLLMService, OpenAIService, LLMServiceFactory
-from app.features.llm.services.llm_service import stream_llm_response
-from app.features.llm.services.base import BaseLLMService, LLMResponse
-from app.features.llm.services.factory import LLMServiceFactory
-from app.features.llm.services.llm_service import (
-    stream_llm_response, 
-    extract_actual_content,
-    build_simple_insert_action
-)
-from app.features.llm.router import router
-default_llm_service = LLMServiceFactory.create_service("openai")
+from importlib import import_module
+
+# Export name -> defining module, for backward-compatible access
+_LAZY_EXPORTS = {
+    'BaseLLMService': 'app.features.llm.services.base',
+    'LLMResponse': 'app.features.llm.services.base',
+    'OpenAIService': 'app.features.llm.services.openai_service',
+    'LLMServiceFactory': 'app.features.llm.services.factory',
+    'get_default_llm_service': 'app.features.llm.services.factory',
+    'stream_llm_response': 'app.features.llm.services.llm_service',
+    'extract_actual_content': 'app.features.llm.services.llm_service',
+    'build_simple_insert_action': 'app.features.llm.services.llm_service',
+    'router': 'app.features.llm.router',
+}
+
 # Export key components
 __all__ = [
     'BaseLLMService',
@@ -22,10 +28,25 @@ __all__ = [
     'LLMServiceFactory',
     'stream_llm_response',
     'default_llm_service',
+    'get_default_llm_service',
     'extract_actual_content',
     'build_simple_insert_action',
     'router'
 ]
 
 
+def __getattr__(name):
+    if name == 'default_llm_service':
+        from app.features.llm.services.factory import get_default_llm_service
+        value = get_default_llm_service()
+    elif name in _LAZY_EXPORTS:
+        value = getattr(import_module(_LAZY_EXPORTS[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Cache on the module; this also overrides the submodule binding for 'router'
+    globals()[name] = value
+    return value
+
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
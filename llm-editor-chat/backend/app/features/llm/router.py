@@ -27,21 +27,17 @@ async def chat_completion(
     """
     Get a chat completion from the LLM service.
     
-    This is a simple example of how to use the LLM service in a FastAPI route.
+    Returns the whole completion from a single non-streaming call.
     For streaming responses, you would typically use a StreamingResponse.
     """
     try:
-        # For demonstration, we'll collect all chunks into a single response
-        full_response = ""
-        async for chunk in llm_service.generate(
+        # Non-streaming endpoint: make a single-shot call instead of collecting stream chunks
+        response = await llm_service.generate_full(
             messages=request.messages,
             model=request.model,
             temperature=request.temperature
-        ):
-            if isinstance(chunk, str):
-                full_response += chunk
-            else:  # It's an LLMResponse
-                full_response = chunk.content
+        )
+        full_response = response.content
         
         return {
             "response": full_response,
@@ -2,7 +2,8 @@
 
 This module provides functionality for generating article outlines using LLM.
 """
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 
 class ArticleOutlineRequest(BaseModel):
@@ -17,9 +18,8 @@ class ArticleOutlineResponse(BaseModel):
     status: str = "success"
     message: str = "Outline generated successfully"
 
-def build_outline_prompt(article_type: str, basic_requirements: str, reference_materials: List[str]) -> str:
-    """Build the complete prompt for article outline generation"""
-    return f"""You are tasked with creating an outline for an article based on specific requirements and reference materials. Your goal is to produce a well-structured outline that adheres to the given guidelines and incorporates relevant information from the provided resources.
+# Prompt skeleton for outline generation; only the three tagged slots vary per request
+_OUTLINE_PROMPT_TEMPLATE = """You are tasked with creating an outline for an article based on specific requirements and reference materials. Your goal is to produce a well-structured outline that adheres to the given guidelines and incorporates relevant information from the provided resources.
 
 First, review the type of article you will be outlining:
 <article_type>
@@ -33,7 +33,7 @@ Next, carefully read and understand the basic requirements for writing the artic
 
 Now, examine the reference materials provided:
 <reference_materials>
-{', '.join(reference_materials) if reference_materials else 'No reference materials provided'}
+{references}
 </reference_materials>
 
 To create an effective outline, follow these steps:
@@ -76,6 +76,34 @@ Title: [Your proposed title for the article]
 [Continue with additional chapters/sections as needed]
 </outline>"""
 
+# Placeholder outline returned until the LLM integration is wired in
+_MOCK_OUTLINE_TEMPLATE = """Title: Sample Article on {article_type}
+
+1. Introduction
+   - Key points to cover: Overview of the topic
+   - Reference material(s) to use: None
+
+2. Main Content
+   - Key points to cover: Core concepts and analysis
+   - Reference material(s) to use: All provided references
+
+3. Conclusion
+   - Key points to cover: Summary and key takeaways
+   - Reference material(s) to use: None"""
+
+@lru_cache(maxsize=256)
+def _build_outline_prompt_cached(article_type: str, basic_requirements: str, references: Tuple[str, ...]) -> str:
+    """Format the outline prompt; cached so repeated requests share one prompt string"""
+    return _OUTLINE_PROMPT_TEMPLATE.format(
+        article_type=article_type,
+        basic_requirements=basic_requirements,
+        references=', '.join(references) if references else 'No reference materials provided'
+    )
+
+def build_outline_prompt(article_type: str, basic_requirements: str, reference_materials: List[str]) -> str:
+    """Build the complete prompt for article outline generation"""
+    return _build_outline_prompt_cached(article_type, basic_requirements, tuple(reference_materials or ()))
+
 async def generate_article_outline(request: ArticleOutlineRequest) -> ArticleOutlineResponse:
     """Generate an article outline based on the given parameters and reference materials.
     
@@ -95,19 +123,7 @@ async def generate_article_outline(request: ArticleOutlineRequest) -> ArticleOut
         
         # Here we'll add the actual LLM integration later
         # For now, return a mock response
-        mock_outline = f"""Title: Sample Article on {request.article_type}
-
-1. Introduction
-   - Key points to cover: Overview of the topic
-   - Reference material(s) to use: None
-
-2. Main Content
-   - Key points to cover: Core concepts and analysis
-   - Reference material(s) to use: All provided references
-
-3. Conclusion
-   - Key points to cover: Summary and key takeaways
-   - Reference material(s) to use: None"""
+        mock_outline = _MOCK_OUTLINE_TEMPLATE.format(article_type=request.article_type)
 
         return ArticleOutlineResponse(outline=mock_outline)
         
@@ -1,6 +1,9 @@
+import json
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, AsyncGenerator, Union, Any
 
+from app.utils.json_recovery import parse_llm_json
+
 
 class LLMResponse:
     """Container for LLM response with metadata."""
@@ -64,6 +67,78 @@ class BaseLLMService(ABC):
         """
         pass
     
+    async def generate_full(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> LLMResponse:
+        """
+        Generate a complete response in a single non-streaming call.
+        
+        Services should override this with a native non-streaming request; the
+        default collects the output of generate().
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            model: Model name to use (optional, service can have default)
+            temperature: Sampling temperature (0.0 to 1.0)
+            **kwargs: Additional model-specific parameters
+            
+        Returns:
+            LLMResponse: The complete response
+        """
+        parts: List[str] = []
+        async for chunk in self.generate(messages=messages, model=model, temperature=temperature, **kwargs):
+            if isinstance(chunk, LLMResponse):
+                return chunk
+            parts.append(chunk)
+        return LLMResponse(content="".join(parts))
+    
+    async def generate_structured(
+        self,
+        messages: List[Dict[str, str]],
+        schema: Dict[str, Any],
+        model: Optional[str] = None,
+        temperature: float = 0.0,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate a response constrained to a JSON schema.
+        
+        Services with native structured output should override this; the
+        default asks for a JSON object via a system message, generates it with
+        generate_full() and parses the reply.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            schema: JSON schema the response must follow
+            model: Model name to use (optional, service can have default)
+            temperature: Sampling temperature (0.0 to 1.0)
+            **kwargs: Additional model-specific parameters
+            
+        Returns:
+            Dict[str, Any]: The structured response as a plain dict
+        
+        Raises:
+            ValueError: If the reply contains no JSON object
+        """
+        instruction = {
+            "role": "system",
+            "content": (
+                "Respond only with a single JSON object that follows this JSON schema:\n"
+                + json.dumps(schema, ensure_ascii=False)
+            )
+        }
+        response = await self.generate_full(
+            [*messages, instruction], model=model, temperature=temperature, **kwargs
+        )
+        data = parse_llm_json(response.content)
+        if not data:
+            raise ValueError(f"Model returned no JSON object for schema: {schema.get('title')}")
+        return data
+    
     @abstractmethod
     def get_available_models(self) -> List[str]:
         """
@@ -78,3 +153,9 @@ class BaseLLMService(ABC):
     async def close(self):
         """Clean up resources."""
         pass
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -1,5 +1,8 @@
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Type, Dict, Any
+import threading
+from typing import Optional, Type, Dict, Any, Tuple, Set
 
 from .base import BaseLLMService
 from .openai_service import OpenAIService
@@ -7,10 +10,28 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Closes of replaced instances scheduled on the running loop; held so they aren't garbage collected mid-close
+_PENDING_CLOSES: Set["asyncio.Task[None]"] = set()
+
+
+def _close_replaced(instance: BaseLLMService) -> None:
+    """Close a shared instance that has been replaced, releasing its connection pool."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Called outside the event loop; nothing else can be using the pool right now
+        asyncio.run(instance.close())
+        return
+    task = loop.create_task(instance.close())
+    _PENDING_CLOSES.add(task)
+    task.add_done_callback(_PENDING_CLOSES.discard)
+
 class LLMServiceFactory:
     """Factory for creating and managing LLM service instances."""
     
-    _instance: Optional[BaseLLMService] = None
+    # Shared instances keyed by (service_type, hash of constructor kwargs)
+    _instances: Dict[Tuple[str, str], BaseLLMService] = {}
+    _lock = threading.Lock()
     _service_registry: Dict[str, Type[BaseLLMService]] = {
         "openai": OpenAIService,
         # Add other service types here as they're implemented
@@ -61,6 +82,12 @@ class LLMServiceFactory:
         logger.info(f"Creating new {service_type} LLM service instance")
         return service_class(**kwargs)
     
+    @staticmethod
+    def _instance_key(service_type: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        """Cache key for a service type and constructor kwargs; secrets are only stored hashed."""
+        digest = hashlib.sha256(repr(sorted(kwargs.items())).encode()).hexdigest()
+        return service_type, digest
+    
     @classmethod
     def get_instance(
         cls, 
@@ -69,7 +96,10 @@ class LLMServiceFactory:
         **kwargs
     ) -> BaseLLMService:
         """
-        Get or create the singleton LLM service instance.
+        Get or create the shared LLM service instance for a service type and configuration.
+        
+        Instances are cached per service type and constructor kwargs, so callers
+        with the same configuration share one client and its connection pool.
         
         Args:
             service_type: Type of service to get/create (default: 'openai')
@@ -77,36 +107,53 @@ class LLMServiceFactory:
             **kwargs: Additional arguments to pass to the service constructor
             
         Returns:
-            BaseLLMService: The singleton service instance
+            BaseLLMService: The shared service instance
         """
-        if force_new or cls._instance is None:
-            # Set default API key if not provided
-            if 'api_key' not in kwargs:
-                kwargs['api_key'] = settings.openai_api_key
-                
-            cls._instance = cls.create_service(service_type, **kwargs)
-            
-        return cls._instance
+        # Set default API key if not provided
+        if 'api_key' not in kwargs:
+            kwargs['api_key'] = settings.openai_api_key
+        key = cls._instance_key(service_type, kwargs)
+        
+        replaced = None
+        with cls._lock:
+            instance = cls._instances.get(key)
+            if force_new or instance is None:
+                replaced = instance
+                instance = cls._instances[key] = cls.create_service(service_type, **kwargs)
+        
+        if replaced is not None:
+            _close_replaced(replaced)
+        return instance
     
     @classmethod
-    def set_instance(cls, instance: BaseLLMService) -> None:
+    def set_instance(cls, instance: BaseLLMService, service_type: str = "openai") -> None:
         """
-        Set the LLM service instance (for testing or dependency injection).
+        Set the default LLM service instance (for testing or dependency injection).
         
         Args:
             instance: The service instance to use
+            service_type: Service type whose default instance is replaced (default: 'openai')
         """
-        cls._instance = instance
+        key = cls._instance_key(service_type, {'api_key': settings.openai_api_key})
+        with cls._lock:
+            replaced = cls._instances.get(key)
+            cls._instances[key] = instance
+        if replaced is not None and replaced is not instance:
+            _close_replaced(replaced)
         logger.info("Manually set LLM service instance")
     
     @classmethod
     async def close(cls) -> None:
-        """Close the current LLM service instance if it exists."""
-        if cls._instance is not None:
-            await cls._instance.close()
-            cls._instance = None
-            logger.info("Closed LLM service instance")
+        """Close all shared LLM service instances."""
+        with cls._lock:
+            instances = list(cls._instances.values())
+            cls._instances.clear()
+        for instance in instances:
+            await instance.close()
+        if instances:
+            logger.info(f"Closed {len(instances)} LLM service instance(s)")
 
 
-# Create a default instance for convenience
-default_llm_service = LLMServiceFactory.get_instance()
+def get_default_llm_service() -> BaseLLMService:
+    """Get the default LLM service instance, creating it on first use."""
+    return LLMServiceFactory.get_instance()
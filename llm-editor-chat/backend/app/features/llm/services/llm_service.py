@@ -2,57 +2,124 @@
 
 This module provides functions for streaming LLM responses and processing LLM outputs.
 """
-from typing import List, Dict, Any, Optional, AsyncGenerator, Union, Tuple, Literal
+from typing import List, Dict, Any, Optional, AsyncGenerator, AsyncIterator, Union, Tuple, Literal
 import asyncio
-import json
+import hashlib
 import re
+import time
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 import os
-from dotenv import load_dotenv
 from pathlib import Path
 import logging
 
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional at runtime; fall back to the stdlib parser
+    import json as _json
+
 from app.features.intent_analysis.services.top_level_intent_service import identify_top_level_intent, TopLevelIntent
 from app.features.intent_analysis.services.intent_service import identify_document_intent, DocumentIntent
+from app.utils.cache_utils import make_cache_key, is_deterministic
+from app.utils.response_cache import SQLiteResponseCache
+from app.config import settings
 # Import DocumentPipelineService lazily to avoid circular imports
 
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-env_path = Path(__file__).parent.parent.parent.parent.parent / '.env'
-load_dotenv(env_path)
-default_api_key = os.getenv("OPENAI_API_KEY")
-if default_api_key is None:
-    logger.warning("OPENAI_API_KEY environment variable not found, will rely on user-provided API keys")
-    default_api_key = ""
-
 # Load editor actions config
 _ACTIONS_CONFIG_PATH = Path(__file__).parent.parent.parent.parent.parent.parent / "shared" / "editor_actions.json"
-with open(_ACTIONS_CONFIG_PATH, encoding="utf-8") as _f:
-    _EDITOR_ACTIONS = json.load(_f).get("actions", {})
+_EDITOR_ACTIONS = _json.loads(_ACTIONS_CONFIG_PATH.read_bytes()).get("actions", {})
+
+# Action types used by this module, resolved once
+_ACTION_INSERT = _EDITOR_ACTIONS.get("insert_text", {}).get("type", "insert-text")
+_ACTION_REPLACE = _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text")
+_INSERT_TYPE_BY_POSITION = {
+    'cursor': _ACTION_INSERT,
+    'start': _EDITOR_ACTIONS.get("insert_at_start", {}).get("type", "insert-at-start"),
+    'end': _EDITOR_ACTIONS.get("insert_at_end", {}).get("type", "insert-at-end"),
+}
+
+# Patterns used by extract_actual_content
+_CONTENT_RE = re.compile(r'<CONTENT>(.*?)</CONTENT>', re.DOTALL)
+_CONTENT_MARKER_RE = re.compile(r'(?:Here\'s the content:|Here is the content:|Content:)(.*)', re.DOTALL)
+_SEPARATOR_RE = re.compile(r'(?:---|===|\*\*\*)(.*)', re.DOTALL)
+_PREFIX_RE = re.compile(r'^(?:I\'ll|Let me|Here\'s|I\'ve|I have|I will|I can|I\'m going to).*?:', re.IGNORECASE)
+_THINKING_MARKERS_RE = re.compile(
+    r'First, let\'s analyze|Let me think about|I\'ll approach this|To solve this|My approach will be|Let\'s break this down',
+    re.IGNORECASE
+)
+_THINKING_SPLIT_RE = re.compile(r'(?:Now, |Finally, |Here\'s |So, |Therefore, )')
+
+# Streamed text is sent in batches of complete lines once either limit is reached
+_THINKING_FLUSH_CHARS = 256
+_THINKING_FLUSH_INTERVAL = 0.05  # seconds
 
-class StreamingCallbackHandler(StreamingStdOutCallbackHandler):
-    """Custom streaming callback handler for LLM responses."""
-    def __init__(self, queue):
-        super().__init__()
-        self.tokens = []
-        self.queue = queue
+_ACTION_OPEN = "[ACTION]"
+_ACTION_CLOSE = "[/ACTION]"
+
+def _partial_tag_len(data: str, start: int, tag: str) -> int:
+    """Length of the longest suffix of data[start:] that is a proper prefix of tag."""
+    for k in range(min(len(tag) - 1, len(data) - start), 0, -1):
+        if data.endswith(tag[:k]):
+            return k
+    return 0
+
+class ActionStreamScanner:
+    """Incrementally split streamed LLM output into plain text and [ACTION] payloads.
+    
+    Tracks whether the stream is inside an [ACTION] block and holds back only the
+    few trailing characters that could be the start of a tag split across tokens,
+    so each token is scanned once with str.find.
+    """
+    def __init__(self):
+        self._in_action = False
+        self._pending = ""
+        self._action_parts: List[str] = []
         
-    def on_llm_new_token(self, token: str, **kwargs):
-        self.tokens.append(token)
-        # Put new token into queue for real-time processing
-        try:
-            self.queue.put_nowait(token)
-        except Exception as e:
-            logger.error(f"Error adding token to queue: {e}", exc_info=True)
+    def feed(self, token: str) -> Tuple[str, List[str]]:
+        """Consume a token.
         
-    def get_tokens(self):
-        return self.tokens
+        Returns:
+            Plain text outside ACTION blocks, and the payloads of any ACTION blocks closed by this token
+        """
+        data = self._pending + token
+        self._pending = ""
+        text_parts: List[str] = []
+        actions: List[str] = []
+        pos = 0
+        while True:
+            tag = _ACTION_CLOSE if self._in_action else _ACTION_OPEN
+            idx = data.find(tag, pos)
+            if idx < 0:
+                keep = _partial_tag_len(data, pos, tag)
+                end = len(data) - keep
+                (self._action_parts if self._in_action else text_parts).append(data[pos:end])
+                self._pending = data[end:]
+                break
+            if self._in_action:
+                self._action_parts.append(data[pos:idx])
+                actions.append("".join(self._action_parts))
+                self._action_parts = []
+            else:
+                text_parts.append(data[pos:idx])
+            self._in_action = not self._in_action
+            pos = idx + len(tag)
+        return "".join(text_parts), actions
+    
+    def flush(self) -> str:
+        """Return any held-back plain text at the end of the stream; an unterminated ACTION block is dropped."""
+        text = "" if self._in_action else self._pending
+        self._pending = ""
+        self._action_parts = []
+        return text
 
-def run_document_pipeline(user_message: str, editor_content: Optional[str], selected_text: Optional[str]) -> Tuple[bool, List[Dict[str, Any]]]:
-    """Extracted document pipeline logic from stream_llm_response."""
+async def run_document_pipeline(user_message: str, editor_content: Optional[str], selected_text: Optional[str]) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Extracted document pipeline logic from stream_llm_response.
+    
+    The pipeline does blocking file I/O and synchronous LLM calls, so it runs in a
+    worker thread to keep the event loop free for other streams.
+    """
     # Import DocumentPipelineService lazily to avoid circular imports
     from app.features.document_editing.services.document_pipeline_service import DocumentPipelineService
     
@@ -61,15 +128,15 @@ def run_document_pipeline(user_message: str, editor_content: Optional[str], sele
     #use_pipeline = pipeline_service.should_use_pipeline(user_message, editor_content, selected_text)
     use_pipeline = True # always use pipeline
     if use_pipeline and editor_content:
-        file_path, success, message = pipeline_service.save_temp_file(editor_content)
+        file_path, success, message = await asyncio.to_thread(pipeline_service.save_temp_file, editor_content)
         if success:
             msgs.append({"type":"thinking","content":"Processing document with intelligent section finding..."})
-            result = pipeline_service.process_document(file_path, user_message)
+            result = await asyncio.to_thread(pipeline_service.process_document, file_path, user_message)
             if result.get("success"):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    updated_content = f.read()
+                # process_document already read the edited file back
+                updated_content = result["updated_content"]
                 msgs.append({"type":"thinking","content":"Document processed successfully. Applying changes..."})
-                action = {"type": _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text"), "payload":{"content":updated_content}}
+                action = {"type": _ACTION_REPLACE, "payload":{"content":updated_content}}
                 msgs.append({"type":"action","content":"Document has been updated with your changes.","action":action})
                 return True, msgs
             else:
@@ -91,43 +158,48 @@ def extract_actual_content(response: str) -> str:
         The extracted actual content
     """
     # Try to find content within <CONTENT> tags
-    content_match = re.search(r'<CONTENT>(.*?)</CONTENT>', response, re.DOTALL)
+    content_match = _CONTENT_RE.search(response)
     if content_match:
         return content_match.group(1).strip()
     
     # Try to find content after "Here's the content:" or similar phrases
-    content_marker_match = re.search(r'(?:Here\'s the content:|Here is the content:|Content:)(.*)', response, re.DOTALL)
+    content_marker_match = _CONTENT_MARKER_RE.search(response)
     if content_marker_match:
         return content_marker_match.group(1).strip()
     
     # Try to find content after a line of dashes or stars (common separator)
-    separator_match = re.search(r'(?:---|===|\*\*\*)(.*)', response, re.DOTALL)
+    separator_match = _SEPARATOR_RE.search(response)
     if separator_match:
         return separator_match.group(1).strip()
     
     # If no specific content markers are found, remove common prefixes
-    cleaned = re.sub(r'^(?:I\'ll|Let me|Here\'s|I\'ve|I have|I will|I can|I\'m going to).*?:', '', response, flags=re.IGNORECASE)
+    cleaned = _PREFIX_RE.sub('', response)
     
     # If the response starts with a thinking/analysis section, try to find where the actual content begins
-    thinking_markers = [
-        r'First, let\'s analyze',
-        r'Let me think about',
-        r'I\'ll approach this',
-        r'To solve this',
-        r'My approach will be',
-        r'Let\'s break this down',
-    ]
-    
-    for marker in thinking_markers:
-        if re.search(marker, cleaned, re.IGNORECASE):
-            # Try to find where the thinking ends and content begins
-            sections = re.split(r'(?:Now, |Finally, |Here\'s |So, |Therefore, )', cleaned, maxsplit=1)
-            if len(sections) > 1:
-                return sections[1].strip()
+    if _THINKING_MARKERS_RE.search(cleaned):
+        # Try to find where the thinking ends and content begins
+        sections = _THINKING_SPLIT_RE.split(cleaned, maxsplit=1)
+        if len(sections) > 1:
+            return sections[1].strip()
     
     # If all else fails, return the original response
     return response.strip()
 
+def _has_multiple_paragraphs(text: str) -> bool:
+    """Whether text has at least two non-empty lines; stops scanning at the second one."""
+    count, pos, n = 0, 0, len(text)
+    while pos < n:
+        nxt = text.find('\n', pos)
+        end = n if nxt == -1 else nxt
+        if not text[pos:end].isspace() and end > pos:
+            count += 1
+            if count >= 2:
+                return True
+        if nxt == -1:
+            break
+        pos = nxt + 1
+    return False
+
 def build_simple_insert_action(response: str, position: Literal['cursor', 'start', 'end'] = 'cursor') -> Dict[str, Any]:
     """Build a simple insert action, adding a newline based on paragraph count.
     
@@ -141,19 +213,12 @@ def build_simple_insert_action(response: str, position: Literal['cursor', 'start
     Returns:
         A dictionary containing the insert action
     """
-    # Count paragraphs (non-empty lines)
-    paragraphs = [p for p in response.split('\n') if p.strip()]
-    
     # Determine action type based on position
-    action_type = _EDITOR_ACTIONS.get("insert_text", {}).get("type", "insert-text")
-    if position == 'start':
-        action_type = _EDITOR_ACTIONS.get("insert_at_start", {}).get("type", "insert-at-start")
-    elif position == 'end':
-        action_type = _EDITOR_ACTIONS.get("insert_at_end", {}).get("type", "insert-at-end")
+    action_type = _INSERT_TYPE_BY_POSITION.get(position, _ACTION_INSERT)
     
     # If multiple paragraphs, add a newline before the content
     content = response
-    if len(paragraphs) > 1 and not response.startswith('\n'):
+    if _has_multiple_paragraphs(response) and not response.startswith('\n'):
         content = '\n' + response
     
     return {
@@ -161,36 +226,143 @@ def build_simple_insert_action(response: str, position: Literal['cursor', 'start
         "payload": {"content": content}
     }
 
-def create_langchain_chat_model(model: str, temperature: float, handler: StreamingCallbackHandler, custom_api_key: Optional[str] = None) -> ChatOpenAI:
-    """Create a LangChain chat model instance.
+# OpenAI models that always use the default API key
+_DEFAULT_OPENAI_MODELS = frozenset({"gpt-4o", "gpt-4", "gpt-3.5-turbo", "gpt-4-turbo"})
+
+# Shared chat model clients keyed by (model, temperature, api key hash); each reuses its HTTP connection pool
+_CHAT_MODEL_CACHE: Dict[Tuple[str, float, str], ChatOpenAI] = {}
+_CHAT_MODEL_CACHE_SIZE = 32
+
+def _resolve_api_key(model: str, custom_api_key: Optional[str] = None) -> str:
+    """API key a request for this model is sent with."""
+    # For default OpenAI models, always use the default API key from config
+    # For custom models (like Claude), use the provided API key if there is one
+    # The default key is resolved per call so a rotated OPENAI_API_KEY takes effect without a restart
+    default_api_key = os.environ.get("OPENAI_API_KEY") or settings.openai_api_key
+    return default_api_key if (model in _DEFAULT_OPENAI_MODELS or not custom_api_key) else custom_api_key
+
+def _api_key_fingerprint(api_key: str) -> str:
+    """Short hash identifying an API key in cache keys without storing the key itself."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+def create_langchain_chat_model(model: str, temperature: float, custom_api_key: Optional[str] = None) -> ChatOpenAI:
+    """Get a shared LangChain chat model instance.
+    
+    Clients carry no per-request state (tokens are read via astream), so one
+    instance per model/temperature/API key is reused across requests.
     
     Args:
         model: Model name
         temperature: Temperature parameter
-        handler: Streaming callback handler
         custom_api_key: Optional custom API key to use instead of the default
     
     Returns:
         ChatOpenAI instance
     """
-    # For default OpenAI models, always use the default API key from config
-    # For custom models (like Claude), use the provided API key
-    default_models = ["gpt-4o", "gpt-4", "gpt-3.5-turbo", "gpt-4-turbo"]
+    api_key_to_use = _resolve_api_key(model, custom_api_key)
     
-    if model in default_models:
-        # Always use the default API key for default OpenAI models
-        api_key_to_use = default_api_key
-    else:
-        # For non-default models (like Claude), use the custom API key if provided
-        api_key_to_use = custom_api_key if custom_api_key else default_api_key
+    key = (model, round(temperature, 2), _api_key_fingerprint(api_key_to_use))
+    client = _CHAT_MODEL_CACHE.get(key)
+    if client is None:
+        if len(_CHAT_MODEL_CACHE) >= _CHAT_MODEL_CACHE_SIZE:
+            # Evict the oldest client
+            _CHAT_MODEL_CACHE.pop(next(iter(_CHAT_MODEL_CACHE)))
+        client = _CHAT_MODEL_CACHE[key] = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            streaming=True,
+            api_key=api_key_to_use
+        )
+    return client
+
+class _SharedStream:
+    """A single upstream token stream replayed to every subscriber.
     
-    return ChatOpenAI(
-        model=model,
-        temperature=temperature,
-        streaming=True,
-        callbacks=[handler],
-        api_key=api_key_to_use
-    )
+    Subscribers that join late first replay the tokens received so far, then
+    follow the live stream; an upstream error is re-raised in each subscriber.
+    """
+    def __init__(self, source: AsyncIterator[str]):
+        self._tokens: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+        
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for token in source:
+                self._tokens.append(token)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+    
+    def _notify(self) -> None:
+        # Wake current waiters and arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def subscribe(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self._tokens):
+                yield self._tokens[i]
+                i += 1
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                return
+            await self._changed.wait()
+
+# Persistent cache of token lists for deterministic (temperature ~0) responses
+_RESPONSE_CACHE = SQLiteResponseCache(
+    settings.llm_cache_db,
+    ttl=settings.llm_cache_ttl,
+    max_entries=settings.llm_cache_max_entries
+)
+
+async def _replay_tokens(tokens: List[str]) -> AsyncIterator[str]:
+    """Yield cached tokens as if they were streamed."""
+    for token in tokens:
+        yield token
+
+# Deterministic streams currently in flight, keyed by API key hash, model, temperature and prompt
+_INFLIGHT_STREAMS: Dict[Tuple[str, str, float, str], _SharedStream] = {}
+
+async def _astream_text(client: ChatOpenAI, messages: List[Any]) -> AsyncIterator[str]:
+    """Yield the non-empty text of each chunk streamed by the model."""
+    async for chunk in client.astream(messages):
+        if chunk.content:
+            yield chunk.content
+
+def _stream_tokens(
+    client: ChatOpenAI,
+    messages: List[Any],
+    model: str,
+    temperature: float,
+    key_fingerprint: str
+) -> AsyncIterator[str]:
+    """Stream model tokens, coalescing identical deterministic requests that are in flight together.
+    
+    With temperature ~0 identical prompts to the same model yield the same output,
+    so a request arriving while an identical one is streaming subscribes to that
+    stream instead of opening another provider request. Only requests made with
+    the same API key share a stream, so one key's quota and errors never serve
+    another's callers.
+    """
+    if not is_deterministic(temperature):
+        return _astream_text(client, messages)
+    
+    key = (key_fingerprint, model, round(temperature, 2), make_cache_key([m.content for m in messages]))
+    shared = _INFLIGHT_STREAMS.get(key)
+    if shared is None:
+        shared = _INFLIGHT_STREAMS[key] = _SharedStream(_astream_text(client, messages))
+        shared.task.add_done_callback(lambda _: _INFLIGHT_STREAMS.pop(key, None))
+    else:
+        logger.info("Joining in-flight identical LLM stream")
+    return shared.subscribe()
 
 async def stream_llm_response(
     system_prompt: str,
@@ -222,18 +394,12 @@ async def stream_llm_response(
     """
     try:
         # Check if we should use the document pipeline
-        use_pipeline, pipeline_msgs = run_document_pipeline(user_message, editor_content, selected_text)
+        use_pipeline, pipeline_msgs = await run_document_pipeline(user_message, editor_content, selected_text)
         if use_pipeline:
             for msg in pipeline_msgs:
                 yield msg
             return
         
-        # Create queue for streaming tokens
-        queue = asyncio.Queue()
-        
-        # Create streaming callback handler
-        handler = StreamingCallbackHandler(queue)
-        
         # Create LangChain chat model
         # If a custom model is specified, use it, otherwise use the default model
         model_to_use = model if model else "gpt-4.1"
@@ -244,154 +410,105 @@ async def stream_llm_response(
             logger.info("Using Claude model with custom API key")
         else:
             logger.info("Using OpenAI model with default API key")
-        client = create_langchain_chat_model(model_to_use, temperature, handler, api_key)
+        client = create_langchain_chat_model(model_to_use, temperature, custom_api_key=api_key)
+        key_fingerprint = _api_key_fingerprint(_resolve_api_key(model_to_use, api_key))
         
         # Prepare messages
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
+        langchain_messages = [SystemMessage(content=system_prompt)]
         
         # Add context information if available
+        # Pieces are joined once so a large editor content is copied a single time
         context_parts = []
         if editor_content:
-            context_parts.append(f"EDITOR CONTENT:\n{editor_content}")
+            context_parts += ("EDITOR CONTENT:\n", editor_content)
         if selected_text:
-            context_parts.append(f"SELECTED TEXT:\n{selected_text}")
+            if context_parts:
+                context_parts.append("\n\n")
+            context_parts += ("SELECTED TEXT:\n", selected_text)
         
         if context_parts:
-            context_message = "\n\n".join(context_parts)
-            messages.append({"role": "user", "content": f"CONTEXT:\n{context_message}"})
+            langchain_messages.append(HumanMessage(content="".join(("CONTEXT:\n", *context_parts))))
         
         # Add user message
-        messages.append({"role": "user", "content": user_message})
-        
-        # Convert messages to LangChain format
-        langchain_messages = []
-        for msg in messages:
-            if msg["role"] == "system":
-                langchain_messages.append(SystemMessage(content=msg["content"]))
-            else:
-                langchain_messages.append(HumanMessage(content=msg["content"]))
+        langchain_messages.append(HumanMessage(content=user_message))
         
-        # Start generating response
-        task = asyncio.create_task(client.ainvoke(langchain_messages))
-        
-        # Define callback for task completion
-        def done_callback(t):
-            try:
-                # Put None in queue to signal end of streaming
-                queue.put_nowait(None)
-            except Exception as e:
-                logger.error(f"Error in done callback: {e}", exc_info=True)
-        
-        # Set callback
-        task.add_done_callback(done_callback)
+        # Deterministic responses are served from the persistent cache when possible
+        cache_key = None
+        cached_tokens = None
+        if settings.llm_cache_enabled and is_deterministic(temperature):
+            # Responses are scoped to the API key that produced them
+            cache_key = make_cache_key([
+                key_fingerprint, system_prompt, user_message, editor_content, selected_text, model_to_use
+            ])
+            cached_tokens = await asyncio.to_thread(_RESPONSE_CACHE.get, cache_key)
         
         # Send initial thinking message
         yield {"type": "thinking", "content": "Thinking..."}
         
         # Process streaming tokens
+        scanner = ActionStreamScanner()
+        clean_parts: List[str] = []
         thinking_buffer = ""
         current_thinking = ""
-        action_pattern = re.compile(r'\[ACTION\](.*?)\[/ACTION\]', re.DOTALL)
+        last_flush = time.monotonic()
         
-        while True:
-            try:
-                # Get next token with timeout
-                token = await asyncio.wait_for(queue.get(), timeout=0.1)
-                
-                # Check if end of streaming
-                if token is None:
-                    break
-                
-                # Add token to thinking buffer
-                thinking_buffer += token
-                
-                # Check if there is a complete thinking block (at least 50 characters)
-                if len(thinking_buffer) >= 50 and "\n" in thinking_buffer:
-                    # Split by newline to get complete thoughts
-                    parts = thinking_buffer.split("\n")
-                    complete_thoughts = parts[:-1]
-                    thinking_buffer = parts[-1]
-                    
-                    # Join complete thoughts
-                    clean_thinking = "\n".join(complete_thoughts)
-                    
-                    # Remove any ACTION blocks
-                    clean_thinking = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', clean_thinking, flags=re.DOTALL)
-                    
-                    # Remove partial ACTION block (only start tag)
-                    clean_thinking = re.sub(r'\[ACTION\].*', '', clean_thinking, flags=re.DOTALL)
-                    
-                    # Remove partial ACTION block (only end tag)
-                    clean_thinking = re.sub(r'.*\[/ACTION\]', '', clean_thinking, flags=re.DOTALL)
-                    
-                    if clean_thinking.strip():
-                        # Send thinking message
-                        current_thinking = clean_thinking.strip()
-                        yield {"type": "message", "content": current_thinking}
-                    
-                    # Reset thinking buffer
-                    thinking_buffer = ""
-                
-                # Check if there is a complete ACTION block
-                action_matches = action_pattern.findall(thinking_buffer)
-                if action_matches:
-                    for action_content in action_matches:
-                        try:
-                            # Parse action content as JSON
-                            action_json = json.loads(action_content.strip())
-                            
-                            # Send action message
-                            yield {"type": "action", "content": "Content generation completed, ready to be inserted into the editor.", "action": action_json}
-                            
-                            # Remove processed action from buffer
-                            thinking_buffer = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', thinking_buffer, flags=re.DOTALL)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, just continue
-                            logger.warning(f"Failed to parse action JSON: {action_content}")
-            except asyncio.TimeoutError:
-                # No token available, just continue
-                pass
-            except Exception as e:
-                # Log error and continue
-                logger.error(f"Error processing token: {e}", exc_info=True)
+        if cached_tokens is not None:
+            logger.info("Serving LLM response from cache")
+            token_source = _replay_tokens(cached_tokens)
+        else:
+            # Stream tokens from the model (shared with identical in-flight deterministic requests)
+            token_source = _stream_tokens(client, langchain_messages, model_to_use, temperature, key_fingerprint)
+        received_tokens: List[str] = []
         
-        # Process any remaining thinking buffer
-        if thinking_buffer.strip():
-            # Remove any ACTION blocks
-            clean_thinking = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', thinking_buffer, flags=re.DOTALL)
-            clean_thinking = re.sub(r'\[ACTION\].*', '', clean_thinking, flags=re.DOTALL)
-            clean_thinking = re.sub(r'.*\[/ACTION\]', '', clean_thinking, flags=re.DOTALL)
+        async for token in token_source:
+            received_tokens.append(token)
             
-            if clean_thinking.strip():
-                # Send final thinking message
-                yield {"type": "message", "content": clean_thinking.strip()}
-        
-        # Wait for the model task to complete
-        await task
-        
-        # Get the final response from the model
-        response = task.result()
-        
-        # Check if there are any ACTION blocks in the final response that weren't caught by streaming
-        content = response.content
-        action_matches = action_pattern.findall(content)
-        
-        if action_matches:
-            for action_content in action_matches:
+            # Separate ACTION blocks from plain text
+            text, action_contents = scanner.feed(token)
+            clean_parts.append(text)
+            thinking_buffer += text
+            
+            # Check if there is a complete thinking block (at least 50 characters) that is
+            # large enough or has waited long enough to be worth a message of its own
+            if (
+                len(thinking_buffer) >= 50
+                and "\n" in thinking_buffer
+                and (len(thinking_buffer) >= _THINKING_FLUSH_CHARS
+                     or time.monotonic() - last_flush >= _THINKING_FLUSH_INTERVAL)
+            ):
+                # Send complete lines, keep the unfinished one
+                complete_thoughts, _, thinking_buffer = thinking_buffer.rpartition("\n")
+                last_flush = time.monotonic()
+                
+                if complete_thoughts.strip():
+                    # Send thinking message
+                    current_thinking = complete_thoughts.strip()
+                    yield {"type": "message", "content": current_thinking}
+            
+            for action_content in action_contents:
                 try:
                     # Parse action content as JSON
-                    action_json = json.loads(action_content.strip())
+                    action_json = _json.loads(action_content.strip())
                     
                     # Send action message
                     yield {"type": "action", "content": "Content generation completed, ready to be inserted into the editor.", "action": action_json}
-                except json.JSONDecodeError:
+                except _json.JSONDecodeError:
                     # If JSON parsing fails, just continue
                     logger.warning(f"Failed to parse action JSON: {action_content}")
         
+        if cache_key is not None and cached_tokens is None and received_tokens:
+            await asyncio.to_thread(_RESPONSE_CACHE.set, cache_key, received_tokens)
+        
+        # Process any remaining thinking buffer
+        text = scanner.flush()
+        clean_parts.append(text)
+        thinking_buffer += text
+        if thinking_buffer.strip():
+            # Send final thinking message
+            yield {"type": "message", "content": thinking_buffer.strip()}
+        
         # Send final message without ACTION blocks
-        clean_content = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', content, flags=re.DOTALL)
+        clean_content = "".join(clean_parts)
         if clean_content.strip() and clean_content.strip() != current_thinking:
             # Only send if it's different from the last thinking message
             yield {"type": "message", "content": clean_content.strip()}
@@ -1,14 +1,130 @@
+import asyncio
+import importlib.util
 import logging
-from typing import Dict, List, Optional, AsyncGenerator, Union, Any
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, AsyncGenerator, Union, Any, Tuple, Callable, Set
 
+import httpx
 from langchain_openai import ChatOpenAI
+from langchain_core.caches import BaseCache, InMemoryCache
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, BaseMessage
 
 from .base import BaseLLMService, LLMResponse
 from app.config import settings
+from app.utils.cache_utils import make_cache_key
+from app.utils.response_cache import SQLiteResponseCache
 
 logger = logging.getLogger(__name__)
 
+
+def _usage_from_metadata(usage_metadata: Optional[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+    """Convert LangChain usage_metadata to OpenAI-style usage; counts are None when unreported."""
+    usage_metadata = usage_metadata or {}
+    return {
+        "prompt_tokens": usage_metadata.get("input_tokens"),
+        "completion_tokens": usage_metadata.get("output_tokens"),
+        "total_tokens": usage_metadata.get("total_tokens"),
+    }
+
+
+# Connection pool shared by every ChatOpenAI client of a service instance
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=40, keepalive_expiry=60.0)
+_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+# HTTP/2 multiplexes concurrent streams over one connection; needs the h2 package (httpx[http2])
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# Concurrent requests in generate_batch_concurrent; more would only queue on the pool
+_BATCH_CONCURRENCY = _HTTP_LIMITS.max_connections
+
+# A chat message as a (role, content) pair
+Message = Tuple[str, str]
+
+# Message class for each chat role; unknown roles are sent as user messages
+_ROLE_TO_CLS = {
+    "user": HumanMessage,
+    "assistant": AIMessage,
+    "system": SystemMessage,
+}
+
+
+
+def _to_langchain_message(role: str, content: Any) -> BaseMessage:
+    """Build the LangChain message for one role/content pair."""
+    if role not in _ROLE_TO_CLS:
+        logger.warning(f"Unknown message role: {role}, treating as user message")
+    return _ROLE_TO_CLS.get(role, HumanMessage)(content=content)
+
+
+def _normalize_messages(messages: List[Union[Dict[str, str], Message]]) -> Tuple[Message, ...]:
+    """Normalize message dicts (or already-normalized pairs) to (role, content) tuples once per request."""
+    return tuple(
+        msg if isinstance(msg, tuple) else (msg["role"], msg["content"])
+        for msg in messages
+    )
+
+
+# kwargs that apply to a single invocation (astream/ainvoke) rather than the ChatOpenAI client
+_CALL_KWARGS = frozenset({"stop", "config"})
+
+
+def _split_kwargs(kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Split kwargs into (ChatOpenAI constructor kwargs, per-call kwargs)."""
+    client_kwargs = {k: v for k, v in kwargs.items() if k not in _CALL_KWARGS}
+    call_kwargs = {k: v for k, v in kwargs.items() if k in _CALL_KWARGS}
+    return client_kwargs, call_kwargs
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Get a streamed chunk's text, flattening list (content block) content to a string."""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        content = "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, str) or (isinstance(part, dict) and part.get("type") == "text")
+        )
+    return content
+
+
+# Streamed chunks buffered ahead of a slow consumer
+_STREAM_QUEUE_SIZE = 64
+# Marks the end of a drained stream
+_STREAM_END = object()
+
+
+async def _drain_stream(
+    client: ChatOpenAI,
+    messages: List[BaseMessage],
+    queue: "asyncio.Queue[Any]",
+    **kwargs
+) -> None:
+    """Read a model stream into queue, then put _STREAM_END, or the exception that ended it."""
+    try:
+        async for chunk in client.astream(messages, **kwargs):
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+        return
+    await queue.put(_STREAM_END)
+
+
+# Exact-match cache of deterministic (temperature 0) responses
+_RESPONSE_CACHE_SIZE = 1024
+# Persistent second tier of the response cache, so cached responses survive restarts
+_PERSISTENT_RESPONSE_CACHE = SQLiteResponseCache(
+    settings.llm_cache_db,
+    ttl=settings.llm_cache_ttl,
+    max_entries=settings.llm_cache_max_entries
+)
+# Cached responses are replayed to streaming callers in slices of this many characters
+_REPLAY_CHUNK_CHARS = 64
+# Entries kept by LangChain's cache for non-streaming deterministic calls
+_LC_CACHE_SIZE = 512
+# Per-call-parameter clients kept per service, least recently used evicted first
+_CLIENT_CACHE_SIZE = 32
+# Pending connection pool closes scheduled by close_sync; held so they aren't garbage collected mid-close
+_PENDING_CLOSES: Set["asyncio.Task[None]"] = set()
+
 class OpenAIService(BaseLLMService):
     """LLM service implementation using OpenAI's API via LangChain."""
     
@@ -37,6 +153,17 @@ class OpenAIService(BaseLLMService):
         )
         self.streaming = streaming
         self._client = None
+        # Clients for per-call parameters, keyed by (model, temperature, streaming, extra kwargs)
+        self._client_cache: "OrderedDict[Tuple[Any, ...], ChatOpenAI]" = OrderedDict()
+        self._http_client = httpx.AsyncClient(
+            limits=_HTTP_LIMITS,
+            timeout=_HTTP_TIMEOUT,
+            http2=_HTTP2_AVAILABLE
+        )
+        # Response cache key -> (stored_at, content), oldest first
+        self._response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # LangChain cache for non-streaming calls (ainvoke, structured output)
+        self._lc_cache: BaseCache = InMemoryCache(maxsize=_LC_CACHE_SIZE)
         
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
@@ -51,27 +178,151 @@ class OpenAIService(BaseLLMService):
                 model=self.default_model,
                 temperature=self.default_temperature,
                 streaming=self.streaming,
+                stream_usage=True,
+                http_async_client=self._http_client,
             )
         return self._client
     
-    def _convert_messages(self, messages: List[Dict[str, str]]) -> List[BaseMessage]:
-        """Convert message dicts to LangChain message objects."""
-        langchain_messages = []
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            
-            if role == "user":
-                langchain_messages.append(HumanMessage(content=content))
-            elif role == "assistant":
-                langchain_messages.append(AIMessage(content=content))
-            elif role == "system":
-                langchain_messages.append(SystemMessage(content=content))
+    def _get_cached_client(
+        self,
+        model: str,
+        temperature: float,
+        streaming: bool,
+        **kwargs
+    ) -> ChatOpenAI:
+        """Get a ChatOpenAI client for these parameters, reusing its connection pool across calls."""
+        try:
+            extra = tuple(sorted(kwargs.items()))
+            hash(extra)
+        except TypeError:
+            # Unhashable values (lists, dicts); key on their canonical JSON digest
+            try:
+                extra = make_cache_key(kwargs)
+            except TypeError:
+                extra = repr(sorted(kwargs.items()))
+        key = (model, temperature, streaming, extra)
+        
+        client = self._client_cache.get(key)
+        if client is not None:
+            self._client_cache.move_to_end(key)
+        else:
+            # LangChain caching doesn't apply to streaming, and only deterministic calls may be cached
+            cache = self._lc_cache if settings.llm_cache_enabled and not streaming and temperature == 0 else None
+            if kwargs:
+                # Extra constructor parameters need full validation
+                client = ChatOpenAI(
+                    api_key=self.api_key,
+                    model=model,
+                    temperature=temperature,
+                    streaming=streaming,
+                    # Ask for real token usage on the final streamed chunk
+                    stream_usage=True,
+                    http_async_client=self._http_client,
+                    cache=cache,
+                    **kwargs
+                )
             else:
-                logger.warning(f"Unknown message role: {role}, treating as user message")
-                langchain_messages.append(HumanMessage(content=content))
-                
-        return langchain_messages
+                # A shallow copy of the default client shares its already-built OpenAI clients
+                client = self._get_client().model_copy(update={
+                    "model_name": model,
+                    "temperature": temperature,
+                    "streaming": streaming,
+                    "cache": cache,
+                })
+            self._client_cache[key] = client
+            if len(self._client_cache) > _CLIENT_CACHE_SIZE:
+                self._client_cache.popitem(last=False)
+        return client
+    
+    def set_llm_cache(self, cache: BaseCache) -> None:
+        """
+        Replace the LangChain cache used for non-streaming calls.
+        
+        Args:
+            cache: Any LangChain BaseCache, e.g. SQLiteCache for a persistent store
+        """
+        self._lc_cache = cache
+        # Existing clients hold the old cache
+        self._client_cache.clear()
+    
+    def _response_cache_key(
+        self,
+        messages: Tuple[Message, ...],
+        model: str,
+        temperature: float,
+        kwargs: Dict[str, Any]
+    ) -> Optional[str]:
+        """Get the response cache key for a request, or None if it must not be cached."""
+        # Only deterministic requests can be answered from the cache
+        if not settings.llm_cache_enabled or temperature != 0:
+            return None
+        try:
+            return make_cache_key({
+                "model": model,
+                "temperature": temperature,
+                "messages": messages,
+                "kwargs": kwargs,
+            })
+        except TypeError:
+            # kwargs carrying non-JSON values (callbacks, clients) are not cacheable
+            return None
+    
+    async def _lookup_response(self, key: str) -> Optional[str]:
+        """Look up a cached response in memory, then on disk."""
+        content = self._get_cached_response(key)
+        if content is None:
+            content = await asyncio.to_thread(_PERSISTENT_RESPONSE_CACHE.get, key)
+            if isinstance(content, str):
+                self._set_cached_response(key, content)
+            else:
+                content = None
+        return content
+    
+    async def _store_response(self, key: str, content: str) -> None:
+        """Store a response in memory and on disk."""
+        self._set_cached_response(key, content)
+        await asyncio.to_thread(_PERSISTENT_RESPONSE_CACHE.set, key, content)
+    
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        """Look up a response in the in-memory cache, dropping it if it has expired."""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, content = entry
+        if time.monotonic() - stored_at > settings.llm_cache_ttl:
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        return content
+    
+    def _set_cached_response(self, key: str, content: str) -> None:
+        """Store a response in memory, evicting the least recently used entries beyond the cache size."""
+        self._response_cache[key] = (time.monotonic(), content)
+        self._response_cache.move_to_end(key)
+        while len(self._response_cache) > _RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    def _build_response(
+        self,
+        content: str,
+        model: str,
+        temperature: float,
+        usage_metadata: Optional[Dict[str, Any]] = None,
+        cached: bool = False
+    ) -> LLMResponse:
+        """Build the final LLMResponse with model, temperature and token usage metadata."""
+        metadata = {
+            "model": model,
+            "temperature": temperature,
+            "usage": _usage_from_metadata(usage_metadata)
+        }
+        if cached:
+            metadata["cached"] = True
+        return LLMResponse(content=content, metadata=metadata)
+    
+    def _convert_messages(self, messages: Tuple[Message, ...]) -> List[BaseMessage]:
+        """Convert normalized (role, content) pairs to fresh LangChain message objects."""
+        return [_to_langchain_message(role, content) for role, content in messages]
     
     async def generate(
         self,
@@ -85,11 +336,12 @@ class OpenAIService(BaseLLMService):
         Generate a response using OpenAI's API.
         
         Args:
-            messages: List of message dicts with 'role' and 'content' keys
+            messages: List of message dicts with 'role' and 'content' keys, or (role, content) tuples
             model: Model name to use. If None, uses the default model.
             temperature: Sampling temperature. If None, uses the default temperature.
             streaming: Whether to use streaming generation. If None, uses the instance default.
-            **kwargs: Additional parameters to pass to the model.
+            **kwargs: Additional parameters. 'stop' and 'config' are passed to each call;
+                everything else (max_tokens, model_kwargs, ...) configures the client.
             
         Yields:
             str: Token chunks during streaming
@@ -98,65 +350,152 @@ class OpenAIService(BaseLLMService):
         model = model or self.default_model
         temperature = temperature if temperature is not None else self.default_temperature
         use_streaming = self.streaming if streaming is None else streaming
+        normalized = _normalize_messages(messages)
         
-        # Create a new client with the specified parameters
-        client = ChatOpenAI(
-            api_key=self.api_key,
-            model=model,
-            temperature=temperature,
-            streaming=use_streaming,
-            **kwargs
-        )
+        # Serve repeated deterministic requests from the response cache
+        cache_key = self._response_cache_key(normalized, model, temperature, kwargs)
+        if cache_key is not None:
+            cached = await self._lookup_response(cache_key)
+            if cached is not None:
+                logger.debug(f"Response cache hit for model {model}")
+                if use_streaming:
+                    for i in range(0, len(cached), _REPLAY_CHUNK_CHARS):
+                        yield cached[i:i + _REPLAY_CHUNK_CHARS]
+                yield self._build_response(cached, model, temperature, cached=True)
+                return
         
-        # Convert messages to LangChain format
-        langchain_messages = self._convert_messages(messages)
+        # Reuse a client with the specified parameters
+        client_kwargs, call_kwargs = _split_kwargs(kwargs)
+        client = self._get_cached_client(model, temperature, use_streaming, **client_kwargs)
         
-        # Buffer to accumulate full response
-        full_response = ""
+        # Convert messages to LangChain format
+        langchain_messages = self._convert_messages(normalized)
         
         try:
             if use_streaming:
-                # Stream the response
-                async for chunk in client.astream(langchain_messages, **kwargs):
-                    if hasattr(chunk, 'content'):
-                        content = chunk.content
-                        if content:
-                            full_response += content
-                            yield content
+                # Collect chunks and join once at the end
+                parts: List[str] = []
+                usage_metadata = None
+                # A background task keeps reading the connection while the consumer is slow
+                queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=_STREAM_QUEUE_SIZE)
+                producer = asyncio.create_task(_drain_stream(client, langchain_messages, queue, **call_kwargs))
+                try:
+                    while True:
+                        chunk = await queue.get()
+                        if chunk is _STREAM_END:
+                            break
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        if getattr(chunk, 'usage_metadata', None):
+                            usage_metadata = chunk.usage_metadata
+                        # Role deltas and the trailing usage chunk carry no text
+                        content = _chunk_text(chunk)
+                        if not content:
+                            continue
+                        parts.append(content)
+                        yield content
+                finally:
+                    # Stop reading if the consumer went away early
+                    producer.cancel()
+                full_response = "".join(parts)
                 
                 # Yield the complete response at the end
                 if full_response:
-                    yield LLMResponse(
-                        content=full_response,
-                        metadata={
-                            "model": model,
-                            "temperature": temperature,
-                            "usage": {
-                                "completion_tokens": len(full_response.split())
-                            }
-                        }
-                    )
+                    if cache_key is not None:
+                        await self._store_response(cache_key, full_response)
+                    yield self._build_response(full_response, model, temperature, usage_metadata)
             else:
                 # Non-streaming mode: get the full response at once
-                response = await client.ainvoke(langchain_messages, **kwargs)
+                response = await client.ainvoke(langchain_messages, **call_kwargs)
                 if hasattr(response, 'content'):
                     full_response = response.content
+                    if cache_key is not None and full_response:
+                        await self._store_response(cache_key, full_response)
                     # Yield the complete response
-                    yield LLMResponse(
-                        content=full_response,
-                        metadata={
-                            "model": model,
-                            "temperature": temperature,
-                            "usage": {
-                                "completion_tokens": len(full_response.split())
-                            }
-                        }
+                    yield self._build_response(
+                        full_response, model, temperature, getattr(response, 'usage_metadata', None)
                     )
                 
         except Exception as e:
             logger.error(f"Error in OpenAI generation: {str(e)}", exc_info=True)
             raise
     
+    async def generate_full(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> LLMResponse:
+        """
+        Generate a complete response with a single non-streaming request.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            model: Model name to use. If None, uses the default model.
+            temperature: Sampling temperature. If None, uses the default temperature.
+            **kwargs: Additional parameters to pass to the model.
+            
+        Returns:
+            LLMResponse: The complete response with metadata
+        """
+        model = model or self.default_model
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        client_kwargs, call_kwargs = _split_kwargs(kwargs)
+        client = self._get_cached_client(model, temperature, False, **client_kwargs)
+        
+        try:
+            response = await client.ainvoke(self._convert_messages(_normalize_messages(messages)), **call_kwargs)
+        except Exception as e:
+            logger.error(f"Error in OpenAI generation: {str(e)}", exc_info=True)
+            raise
+        
+        return self._build_response(response.content, model, temperature, response.usage_metadata)
+    
+    async def generate_structured(
+        self,
+        messages: List[Dict[str, str]],
+        schema: Dict[str, Any],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate a schema-constrained response using OpenAI tool calling.
+        
+        The schema is sent once as a tool signature and the model's tool
+        arguments are returned directly, so no JSON recovery is needed.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            schema: JSON schema (with title and description) for the tool
+            model: Model name to use. If None, uses the default model.
+            temperature: Sampling temperature. If None, uses the default temperature.
+            **kwargs: Additional parameters to pass to the model.
+            
+        Returns:
+            Dict[str, Any]: The parsed tool arguments
+        """
+        model = model or self.default_model
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        client_kwargs, call_kwargs = _split_kwargs(kwargs)
+        client = self._get_cached_client(model, temperature, False, **client_kwargs)
+        structured_client = client.with_structured_output(schema, method="function_calling")
+        
+        try:
+            result = await structured_client.ainvoke(
+                self._convert_messages(_normalize_messages(messages)), **call_kwargs
+            )
+        except Exception as e:
+            logger.error(f"Error in OpenAI structured generation: {str(e)}", exc_info=True)
+            raise
+        
+        if not isinstance(result, dict):
+            raise ValueError(f"Model returned no structured output for schema: {schema.get('title')}")
+        return result
+    
     async def generate_batch(
         self,
         messages_list: List[List[Dict[str, str]]],
@@ -184,6 +523,70 @@ class OpenAIService(BaseLLMService):
             for messages in messages_list
         ]
     
+    def make_session(
+        self,
+        system_prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None
+    ) -> Callable[[str], AsyncGenerator[str, None]]:
+        """
+        Build a streaming function specialized for a fixed system prompt, model and temperature.
+        
+        The system message and client are resolved once here, so each turn
+        only builds the user message before streaming.
+        
+        Args:
+            system_prompt: System prompt shared by every turn of the session
+            model: Model name to use. If None, uses the default model.
+            temperature: Sampling temperature. If None, uses the default temperature.
+            
+        Returns:
+            An async generator function taking the user message and yielding token chunks
+        """
+        model = model or self.default_model
+        temperature = temperature if temperature is not None else self.default_temperature
+        client = self._get_cached_client(model, temperature, True)
+        prefix = [SystemMessage(content=system_prompt)]
+        
+        async def stream(user_message: str) -> AsyncGenerator[str, None]:
+            async for chunk in client.astream(prefix + [HumanMessage(content=user_message)]):
+                content = _chunk_text(chunk)
+                if content:
+                    yield content
+        
+        return stream
+    
+    async def generate_batch_concurrent(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> List[LLMResponse]:
+        """
+        Generate complete responses for multiple conversations concurrently.
+        
+        Unlike generate_batch, the requests run in parallel, so the batch takes
+        about as long as its slowest request. Concurrency is capped at the
+        HTTP pool's max_connections.
+        
+        Args:
+            messages_list: List of message lists, where each list is a conversation
+            model: Model name to use. If None, uses the default model.
+            temperature: Sampling temperature. If None, uses the default temperature.
+            **kwargs: Additional parameters to pass to the model.
+            
+        Returns:
+            List of responses, in the same order as messages_list
+        """
+        semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+        
+        async def _run(messages: List[Dict[str, str]]) -> LLMResponse:
+            async with semaphore:
+                return await self.generate_full(messages, model=model, temperature=temperature, **kwargs)
+        
+        return await asyncio.gather(*(_run(messages) for messages in messages_list))
+    
     def get_available_models(self) -> List[str]:
         """Get list of available OpenAI models."""
         # Note: In a real implementation, you'd want to call the OpenAI API
@@ -200,14 +603,37 @@ class OpenAIService(BaseLLMService):
         if self._client is not None:
             # LangChain's ChatOpenAI doesn't have a close method, but we'll clean up anyways
             self._client = None
+        self._client_cache.clear()
+        self._response_cache.clear()
+        if not self._http_client.is_closed:
+            await self._http_client.aclose()
     
     def close_sync(self):
-        """Synchronous version of close for use in __del__."""
-        if self._client is not None:
-            self._client = None
+        """Synchronous version of close for use in __del__. Safe to call more than once."""
+        # Attributes may be missing if __init__ failed part way
+        http_client = getattr(self, "_http_client", None)
+        self._client = None
+        for cache in (getattr(self, "_client_cache", None), getattr(self, "_response_cache", None)):
+            if cache is not None:
+                cache.clear()
+        
+        if http_client is None or http_client.is_closed:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop to close on; the app's shutdown hook closes the pool via close()
+            return
+        task = loop.create_task(http_client.aclose())
+        _PENDING_CLOSES.add(task)
+        task.add_done_callback(_PENDING_CLOSES.discard)
             
     def __del__(self):
         """Ensure resources are cleaned up when the object is garbage collected."""
         # Note: This is not guaranteed to be called in all Python implementations
         # and we can't call async methods in __del__, so we use the sync version
-        self.close_sync()
+        try:
+            self.close_sync()
+        except Exception:
+            # Module globals may already be torn down during interpreter shutdown
+            pass
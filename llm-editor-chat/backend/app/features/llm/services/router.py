@@ -1,20 +1,26 @@
-from typing import List, Dict, Any, Callable, Optional, AsyncGenerator, Union, Tuple, Literal
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Optional, AsyncGenerator, Union, Tuple, Literal
 import asyncio
 import json
 import re
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
 from langchain_core.messages import HumanMessage, SystemMessage
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
 logger = logging.getLogger(__name__)
-from app.features.intent_analysis.services.top_level_intent_service import identify_top_level_intent, TopLevelIntent
-from app.features.intent_analysis.services.intent_service import identify_document_intent, DocumentIntent
-from app.features.document_editing.services.document_pipeline_service import DocumentPipelineService  # Updated import path
+from app.features.intent_analysis.services.top_level_intent_service import identify_top_level_intent, TopLevelIntent, format_top_level_intent
 
-# Import StreamingCallbackHandler from llm_service to avoid duplication
-from app.features.llm.services.llm_service import StreamingCallbackHandler
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# Import the shared chat model pool from llm_service to avoid duplication
+from app.features.llm.services.llm_service import create_langchain_chat_model as _get_shared_chat_model
+from app.features.llm.services.llm_service import ActionStreamScanner
+# Persistent response cache shared with llm_service
+from app.features.llm.services.llm_service import _RESPONSE_CACHE, _resolve_api_key, _api_key_fingerprint
+from app.utils.cache_utils import make_cache_key, is_deterministic
+from app.config import settings
 
 # Load environment variables
 env_path = Path(__file__).parent.parent.parent.parent / '.env'
@@ -28,23 +34,67 @@ _ACTIONS_CONFIG_PATH = Path(__file__).parent.parent.parent.parent.parent.parent
 with open(_ACTIONS_CONFIG_PATH, encoding="utf-8") as _f:
     _EDITOR_ACTIONS = json.load(_f).get("actions", {})
 
-# StreamingCallbackHandler is now imported from llm_service.py
+# Action types resolved once at import
+_ACTION_INSERT = _EDITOR_ACTIONS.get("insert_text", {}).get("type", "insert-text")
+_ACTION_REPLACE = _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text")
 
-def run_document_pipeline(user_message: str, editor_content: Optional[str], selected_text: Optional[str]) -> Tuple[bool, List[Dict[str, Any]]]:
-    """Extracted document pipeline logic from stream_llm_response."""
+# 预编译的正则表达式，避免在每次调用/每个token时重复查找编译缓存
+# 内容标记，按优先级排列，并按共同的字面前缀分组：(组子串, [(必须出现的字面子串, 正则), ...])
+# 先用 str.find 检查组子串，组内标记只有在其字面子串出现时才运行正则
+_CONTENT_MARKER_GROUPS = [
+    (group, [(needle, re.compile(pattern, re.DOTALL)) for needle, pattern in markers])
+    for group, markers in (
+        # <CONTENT>标签（优先级最高）
+        ("<CONTENT>", [("<CONTENT>", r'<CONTENT>(\s*[\s\S]*?\s*)</CONTENT>')]),
+        
+        # 查找HTML或代码块
+        ("```", [
+            ("```html", r'```html\s*([\s\S]*?)```'),  # HTML代码块
+            ("```markdown", r'```markdown\s*([\s\S]*?)```'),  # Markdown代码块
+            ("```", r'```([\s\S]*?)```'),  # 任意代码块
+        ]),
+        ("<p", [("<p", r'<p[^>]*>(.*?)</p>')]),  # HTML段落标签
+        
+        # 查找内容生成部分
+        ("2. ", [("2. ", r'2\. (?:Content Generation|Generate[\s\S]*?content)[:\s]*([\s\S]*?)(?:3\.|$)')]),  # 内容生成部分
+        ("Content", [("Content", r'Content[:\s]*([\s\S]*?)(?:$|\n\n\d\.)')]),  # 以Content:开头的部分
+        
+        # 查找最终结果部分
+        ("Result", [
+            ("Final Result", r'Final Result[:\s]*([\s\S]*?)(?:$|\n\n)'),  # 最终结果部分
+            ("Result", r'Result[:\s]*([\s\S]*?)(?:$|\n\n)'),  # 结果部分
+        ]),
+    )
+]
+_NUMBERED_RE = re.compile(r'^\d+\.\s')
+# 整段文本中可能存在编号行的快速检查（宽松匹配，只用于跳过逐行扫描）
+_NUMBERED_ANY_RE = re.compile(r'^\s*\d+\.\s', re.MULTILINE)
+
+# 思考步骤结束的字符：token 以其中之一结尾时发送当前思考内容
+_SENT_END = frozenset('.?!\n')
+
+async def run_document_pipeline(user_message: str, editor_content: Optional[str], selected_text: Optional[str]) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Extracted document pipeline logic from stream_llm_response.
+    
+    The temp file I/O and the synchronous pipeline run in a worker thread so
+    the event loop stays free for other streams.
+    """
+    # 只有走文档流水线时才需要导入
+    from app.features.document_editing.services.document_pipeline_service import DocumentPipelineService
+    
     msgs: List[Dict[str, Any]] = []
     pipeline_service = DocumentPipelineService.get_instance()
     use_pipeline = pipeline_service.should_use_pipeline(user_message, editor_content, selected_text)
     if use_pipeline and editor_content:
-        file_path, success, message = pipeline_service.save_temp_file(editor_content)
+        file_path, success, message = await asyncio.to_thread(pipeline_service.save_temp_file, editor_content)
         if success:
             msgs.append({"type":"thinking","content":"Processing document with intelligent section finding..."})
-            result = pipeline_service.process_document(file_path, user_message)
+            result = await asyncio.to_thread(pipeline_service.process_document, file_path, user_message)
             if result.get("success"):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    updated_content = f.read()
+                # process_document already read the edited file back
+                updated_content = result["updated_content"]
                 msgs.append({"type":"thinking","content":"Document processed successfully. Applying changes..."})
-                action = {"type": _EDITOR_ACTIONS.get("replace_text", {}).get("type", "replace-text"), "payload":{"content":updated_content}}
+                action = {"type": _ACTION_REPLACE, "payload":{"content":updated_content}}
                 msgs.append({"type":"action","content":"Document has been updated with your changes.","action":action})
                 return True, msgs
             else:
@@ -65,41 +115,25 @@ def extract_actual_content(response: str) -> str:
     返回:
     - 提取出的实际内容
     """
-    # 首先查找<CONTENT>标签中的内容（优先级最高）
-    content_tag_pattern = r'<CONTENT>(\s*[\s\S]*?\s*)</CONTENT>'
-    content_matches = re.findall(content_tag_pattern, response, re.DOTALL)
-    if content_matches:
-        return content_matches[0].strip()
-    
-    # 如果没有<CONTENT>标签，尝试查找其他常见的内容标记
-    content_markers = [
-        # 查找HTML或代码块
-        (r'```html\s*([\s\S]*?)```', 1),  # HTML代码块
-        (r'```markdown\s*([\s\S]*?)```', 1),  # Markdown代码块
-        (r'```([\s\S]*?)```', 1),  # 任意代码块
-        (r'<p[^>]*>(.*?)</p>', 1),  # HTML段落标签
-        
-        # 查找内容生成部分
-        (r'2\. (?:Content Generation|Generate[\s\S]*?content)[:\s]*([\s\S]*?)(?:3\.|$)', 1),  # 内容生成部分
-        (r'Content[:\s]*([\s\S]*?)(?:$|\n\n\d\.)', 1),  # 以Content:开头的部分
-        
-        # 查找最终结果部分
-        (r'Final Result[:\s]*([\s\S]*?)(?:$|\n\n)', 1),  # 最终结果部分
-        (r'Result[:\s]*([\s\S]*?)(?:$|\n\n)', 1),  # 结果部分
-    ]
-    
-    # 尝试使用每个标记提取内容
-    for pattern, group in content_markers:
-        matches = re.findall(pattern, response, re.DOTALL)
-        if matches:
-            # 使用第一个匹配结果
-            return matches[0].strip()
+    # 按优先级尝试每个内容标记（首先是<CONTENT>标签），使用第一个匹配结果
+    for group, markers in _CONTENT_MARKER_GROUPS:
+        if response.find(group) < 0:
+            # 组子串不存在时整组标记都不可能匹配
+            continue
+        for needle, marker_re in markers:
+            if needle != group and response.find(needle) < 0:
+                continue
+            match = marker_re.search(response)
+            if match:
+                return match.group(1).strip()
     
     # 如果没有找到明确的内容标记，尝试基于结构分析
-    lines = response.split('\n')
-    
     # 检查是否有编号列表格式 (1. xxx, 2. xxx)
-    numbered_lines = [i for i, line in enumerate(lines) if re.match(r'^\d+\.\s', line.strip())]
+    if _NUMBERED_ANY_RE.search(response):
+        lines = response.split('\n')
+        numbered_lines = [i for i, line in enumerate(lines) if _NUMBERED_RE.match(line.strip())]
+    else:
+        numbered_lines = []
     
     if numbered_lines:
         # 找到最后一个编号后的所有内容
@@ -129,30 +163,100 @@ def build_simple_insert_action(response: str, position: Literal['cursor', 'start
     content = response if len(paragraphs) <= 1 else "\n\n" + response
     
     return {
-        "type": _EDITOR_ACTIONS.get("insert_text", {}).get("type", "insert-text"),
+        "type": _ACTION_INSERT,
         "position": position,
         "payload": {"content": content}
     }
 
-def create_langchain_chat_model(model: str, temperature: float, handler: StreamingCallbackHandler) -> ChatOpenAI:
-    """创建 LangChain 聊天模型实例。
+def create_langchain_chat_model(model: str, temperature: float) -> "ChatOpenAI":
+    """获取共享的 LangChain 聊天模型实例。
+    
+    同一 (model, temperature) 复用同一个客户端及其连接池；客户端不保存
+    任何请求状态，token 通过 astream 直接读取。
     
     参数:
     - model: 模型名称
     - temperature: 温度参数
-    - handler: 流式回调处理器
     
     返回:
     - ChatOpenAI 实例
     """
-    return ChatOpenAI(
-        api_key=api_key,
-        model=model,
-        temperature=temperature,
-        streaming=True,
-        callbacks=[handler],
-        verbose=True
-    )
+    return _get_shared_chat_model(model, temperature, custom_api_key=api_key)
+
+# 进行中的意图识别任务，按消息去重
+_INFLIGHT_INTENTS: Dict[str, "asyncio.Task[TopLevelIntent]"] = {}
+
+async def _identify_intent_deduped(user_message: str) -> TopLevelIntent:
+    """相同消息并发到达时共用同一次进行中的意图识别，不引入任何等待窗口"""
+    task = _INFLIGHT_INTENTS.get(user_message)
+    if task is None:
+        task = _INFLIGHT_INTENTS[user_message] = asyncio.create_task(identify_top_level_intent(user_message))
+        task.add_done_callback(lambda _: _INFLIGHT_INTENTS.pop(user_message, None))
+    # shield：某个请求被取消（客户端断开）时不影响其他共用该任务的请求
+    return await asyncio.shield(task)
+
+@lru_cache(maxsize=64)
+def _system_message(prompt: str) -> SystemMessage:
+    """系统提示词通常按意图固定，复用同一个 SystemMessage 而不是每次请求重新构造"""
+    return SystemMessage(content=prompt)
+
+async def _stream_model_tokens(
+    system_prompt: str,
+    user_message: str,
+    extras: List[str],
+    model: str,
+    temperature: float
+) -> AsyncGenerator[str, None]:
+    """调用模型并逐个产出token。
+    
+    参数:
+    - system_prompt: 系统提示词
+    - user_message: 用户消息
+    - extras: 追加在用户消息之后的上下文消息（编辑器内容、选中文本等）
+    - model: 模型名称
+    - temperature: 温度参数
+    
+    返回:
+    - 异步生成器，产出模型生成的token；模型调用出错时记录日志并提前结束
+    """
+    # 确定性请求（温度约为0）先查响应缓存，命中时直接回放缓存的token
+    cache_key = None
+    if settings.llm_cache_enabled and is_deterministic(temperature):
+        # 使用原始用户消息：仅空白不同的提示（代码、缩进、诗歌）可能需要不同的回答
+        key_fingerprint = _api_key_fingerprint(_resolve_api_key(model, api_key))
+        cache_key = make_cache_key([key_fingerprint, system_prompt, user_message, extras, model])
+        cached_tokens = await asyncio.to_thread(_RESPONSE_CACHE.get, cache_key)
+        if cached_tokens is not None:
+            for token in cached_tokens:
+                yield token
+            return
+    
+    chat = create_langchain_chat_model(model, temperature)
+    
+    # 构造消息
+    messages = [
+        _system_message(system_prompt),
+        HumanMessage(content=user_message)
+    ]
+    messages.extend(HumanMessage(content=extra) for extra in extras)
+    
+    received_tokens: List[str] = []
+    try:
+        # 直接读取模型的流式输出
+        async for chunk in chat.astream(messages):
+            token = chunk.content
+            if not token:
+                continue
+            received_tokens.append(token)
+            yield token
+        # 只缓存成功完成的响应
+        if cache_key is not None and received_tokens:
+            await asyncio.to_thread(_RESPONSE_CACHE.set, cache_key, received_tokens)
+    except asyncio.CancelledError:
+        logger.warning("Stream processing was cancelled")
+        raise  # 重新抛出异常，让调用者知道处理被取消
+    except Exception as e:
+        logger.error(f"Error in stream processing loop: {e}", exc_info=True)
 
 async def stream_llm_response(
     system_prompt: str,
@@ -182,8 +286,8 @@ async def stream_llm_response(
         # 使用顶层意图识别决定是否使用新流水线
         if top_level_intent is None:
             # 只有在没有传入意图时才调用意图识别
-            top_intent = await identify_top_level_intent(user_message)
-            yield {"type": "thinking", "content": f"Intent: {top_intent.intent_type} (置信度 {top_intent.confidence:.2f})"}
+            top_intent = await _identify_intent_deduped(user_message)
+            yield {"type": "thinking", "content": format_top_level_intent(top_intent)}
         else:
             # 使用传入的意图，避免重复调用
             top_intent = top_level_intent
@@ -194,96 +298,17 @@ async def stream_llm_response(
             # 发送思考消息
             # yield {"type": "thinking", "content": "Processing question without editor changes..."}
             
-            # 创建异步队列用于实时处理token
-            token_queue = asyncio.Queue()
-            
-            # 创建流式回调处理器
-            handler = StreamingCallbackHandler(token_queue)
-            
-            # 创建聊天模型
-            chat = create_langchain_chat_model(model, temperature, handler)
-            
-            # 构造消息
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_message)
-            ]
-            
+            extras = []
             # 如果有编辑器内容，添加到消息中
             if editor_content:
-                messages.append(HumanMessage(content=f"Current editor content (for reference only, do not repeat this content in your answer):\n{editor_content}"))
-                
+                extras.append(f"Current editor content (for reference only, do not repeat this content in your answer):\n{editor_content}")
             # 如果有选中文本，添加到消息中
             if selected_text:
-                messages.append(HumanMessage(content=f"Selected text:\n{selected_text}"))
-            
-            # 异步调用模型
-            task = asyncio.create_task(chat.ainvoke(messages))
-            
-            # 设置任务完成回调，确保任务被正确清理
-            def done_callback(t):
-                try:
-                    # 检查任务是否有异常
-                    if t.exception() is not None and not isinstance(t.exception(), asyncio.CancelledError):
-                        logger.error(f"Task completed with exception: {t.exception()}", exc_info=True)
-                except asyncio.CancelledError:
-                    logger.warning("Task was cancelled")
-                except Exception as e:
-                    logger.error(f"Error in done callback: {e}", exc_info=True)
-                    
-            task.add_done_callback(done_callback)
-            
-            # 收集完整响应并实时显示
-            full_response = ""
-            current_chunk = ""
-            
-            # 处理流式输出
-            try:
-                while not task.done() or not token_queue.empty():
-                    try:
-                        # 以非阻塞方式从队列获取token
-                        token = await asyncio.wait_for(token_queue.get(), timeout=0.1)
-                        full_response += token
-                        current_chunk += token
-                        
-                        # 实时发送消息更新
-                        # 在句子结束或换行时清空当前块
-                        if token in ['.', '?', '!', '\n']:
-                            current_chunk = ""
-                            
-                        # yield only new token to avoid repeating full content
-                        yield {"type": "stream", "content": token}
-                    except asyncio.TimeoutError:
-                        # 没有可用的token，继续
-                        pass
-                    except Exception as e:
-                        # 记录错误并继续
-                        logger.error(f"Error processing token: {e}", exc_info=True)
-            except asyncio.CancelledError:
-                logger.warning("Stream processing was cancelled")
-                # 确保任务被取消
-                if not task.done():
-                    task.cancel()
-                raise  # 重新抛出异常，让调用者知道处理被取消
-            except Exception as e:
-                logger.error(f"Error in stream processing loop: {e}", exc_info=True)
-                # 确保任务被取消
-                if not task.done():
-                    task.cancel()
-            
-            # 等待模型任务完成
-            try:
-                await task
-            except asyncio.CancelledError:
-                logger.warning("Task await was cancelled")
-                raise  # 重新抛出异常
-            except Exception as e:
-                logger.error(f"Error awaiting task: {e}", exc_info=True)
-            
-            # Removed final full_response yield to avoid duplicate display when streaming
-            # if full_response.strip():
-            #     yield {"type": "message", "content": full_response.strip()}
+                extras.append(f"Selected text:\n{selected_text}")
             
+            # yield only new token to avoid repeating full content
+            async for token in _stream_model_tokens(system_prompt, user_message, extras, model, temperature):
+                yield {"type": "stream", "content": token}
             return
             
         # 处理创建新文档意图（create_new）
@@ -292,83 +317,17 @@ async def stream_llm_response(
             doc_type = second_level_intent or 'document'
             # yield {"type": "thinking", "content": f"Creating new {doc_type}..."}
             
-            # Create async queue for real-time token processing
-            token_queue = asyncio.Queue()
-            
             # Send "thinking" message
             yield {"type": "thinking", "content": "Creating content to add..."}
             
-            # Create streaming callback handler
-            handler = StreamingCallbackHandler(token_queue)
-            
-            # Create chat model
-            chat = create_langchain_chat_model(model, temperature, handler)
-            
-            # Construct messages
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_message)
-            ]
-            
             # 对于创建新内容的意图，不添加编辑器现有内容，以避免内容重复
-            # 这里故意留空，不添加编辑器内容
-                
-            # If there is selected text, add it to the messages
-            if selected_text:
-                messages.append(HumanMessage(content=f"Selected text:\n{selected_text}"))
-            
-            # Async invoke the model
-            task = asyncio.create_task(chat.ainvoke(messages))
-            
-            # Set task completion callback to ensure task is properly cleaned up
-            def done_callback(t):
-                try:
-                    # Check if task has an exception
-                    if t.exception() is not None and not isinstance(t.exception(), asyncio.CancelledError):
-                        logger.error(f"Task completed with exception: {t.exception()}", exc_info=True)
-                except asyncio.CancelledError:
-                    logger.warning("Task was cancelled")
-                except Exception as e:
-                    logger.error(f"Error in done callback: {e}", exc_info=True)
-                    
-            task.add_done_callback(done_callback)
+            extras = [f"Selected text:\n{selected_text}"] if selected_text else []
             
             # Collect full response and send insert action
-            full_response = ""
-            
-            # Process streaming output
-            try:
-                while not task.done() or not token_queue.empty():
-                    try:
-                        # Get token from queue in non-blocking way
-                        token = await asyncio.wait_for(token_queue.get(), timeout=0.1)
-                        full_response += token
-                    except asyncio.TimeoutError:
-                        # No token available, just continue
-                        pass
-                    except Exception as e:
-                        # Log error and continue
-                        logger.error(f"Error processing token: {e}", exc_info=True)
-            except asyncio.CancelledError:
-                logger.warning("Stream processing was cancelled")
-                # Ensure task is cancelled
-                if not task.done():
-                    task.cancel()
-                raise  # Re-raise exception to let caller know processing was cancelled
-            except Exception as e:
-                logger.error(f"Error in stream processing loop: {e}", exc_info=True)
-                # Ensure task is cancelled
-                if not task.done():
-                    task.cancel()
-            
-            # Wait for model task to complete
-            try:
-                await task
-            except asyncio.CancelledError:
-                logger.warning("Task await was cancelled")
-                raise  # Re-raise exception
-            except Exception as e:
-                logger.error(f"Error awaiting task: {e}", exc_info=True)
+            response_parts: List[str] = []
+            async for token in _stream_model_tokens(system_prompt, user_message, extras, model, temperature):
+                response_parts.append(token)
+            full_response = "".join(response_parts)
             
             # Extract the actual content from LLM response
             # We need to filter out the analysis/thinking process and only keep the actual content
@@ -386,77 +345,13 @@ async def stream_llm_response(
             # 发送思考消息
             yield {"type": "thinking", "content": "Generating content to insert into editor..."}
             
-            # 创建异步队列用于实时处理token
-            token_queue = asyncio.Queue()
-            
-            # 创建流式回调处理器
-            handler = StreamingCallbackHandler(token_queue)
-            
-            # 创建聊天模型
-            chat = create_langchain_chat_model(model, temperature, handler)
-            
-            # 构造消息
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_message)
-            ]
-                
-            # 如果有选中文本，添加到消息中
-            if selected_text:
-                messages.append(HumanMessage(content=f"Selected text:\n{selected_text}"))
-            
-            # 异步调用模型
-            task = asyncio.create_task(chat.ainvoke(messages))
-            
-            # 设置任务完成回调，确保任务被正确清理
-            def done_callback(t):
-                try:
-                    # 检查任务是否有异常
-                    if t.exception() is not None and not isinstance(t.exception(), asyncio.CancelledError):
-                        logger.error(f"Task completed with exception: {t.exception()}", exc_info=True)
-                except asyncio.CancelledError:
-                    logger.warning("Task was cancelled")
-                except Exception as e:
-                    logger.error(f"Error in done callback: {e}", exc_info=True)
-                    
-            task.add_done_callback(done_callback)
+            extras = [f"Selected text:\n{selected_text}"] if selected_text else []
             
             # 收集完整响应，不进行流式显示
-            full_response = ""
-            
-            # 处理流式输出
-            try:
-                while not task.done() or not token_queue.empty():
-                    try:
-                        # 以非阻塞方式从队列获取token
-                        token = await asyncio.wait_for(token_queue.get(), timeout=0.1)
-                        full_response += token
-                    except asyncio.TimeoutError:
-                        # 没有可用的token，继续
-                        pass
-                    except Exception as e:
-                        # 记录错误并继续
-                        logger.error(f"Error processing token: {e}", exc_info=True)
-            except asyncio.CancelledError:
-                logger.warning("Stream processing was cancelled")
-                # 确保任务被取消
-                if not task.done():
-                    task.cancel()
-                raise  # 重新抛出异常，让调用者知道处理被取消
-            except Exception as e:
-                logger.error(f"Error in stream processing loop: {e}", exc_info=True)
-                # 确保任务被取消
-                if not task.done():
-                    task.cancel()
-            
-            # 等待模型任务完成
-            try:
-                await task
-            except asyncio.CancelledError:
-                logger.warning("Task await was cancelled")
-                raise  # 重新抛出异常
-            except Exception as e:
-                logger.error(f"Error awaiting task: {e}", exc_info=True)
+            response_parts: List[str] = []
+            async for token in _stream_model_tokens(system_prompt, user_message, extras, model, temperature):
+                response_parts.append(token)
+            full_response = "".join(response_parts)
             
             # 构建简单插入动作
             action = build_simple_insert_action(full_response.strip())
@@ -474,123 +369,83 @@ async def stream_llm_response(
         
         if use_thinking_pipeline:
             # 使用新的thinking流水线处理用户输入，并在出错时回退
-            yield msg
-        if handled:
-            return
-        
-        # Create async queue for real-time token processing
-        token_queue = asyncio.Queue()
+            # 流水线会加载动作规划等模块，只在这一分支中导入
+            from app.features.llm.services.thinking_pipeline import process_user_input
+            
+            handled = False
+            try:
+                async for msg in process_user_input(
+                    user_message, editor_content, selected_text, top_level_intent=top_intent
+                ):
+                    yield msg
+                    if msg.get("type") == "action":
+                        handled = True
+                        break
+            except Exception as e:
+                logger.warning(f"Thinking pipeline failed, falling back to direct generation: {e}", exc_info=True)
+            if handled:
+                return
         
         # Send "thinking" message
         yield {"type": "thinking", "content": "Analyzing your request..."}
         
-        # Create streaming callback handler
-        handler = StreamingCallbackHandler(token_queue)
-        
-        # Create chat model
-        chat = create_langchain_chat_model(model, temperature, handler)
-        
-        # Construct messages
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_message)
-        ]
-                    
         # If there is selected text, add it to the messages
-        if selected_text:
-            messages.append(HumanMessage(content=f"Selected text:\n{selected_text}"))
-        
-        # Async invoke the model
-        task = asyncio.create_task(chat.ainvoke(messages))
+        extras = [f"Selected text:\n{selected_text}"] if selected_text else []
         
         # Variables for collecting thinking process
         current_thinking = ""
-        thinking_buffer = ""
-        action_pattern = re.compile(r'\[ACTION\](.*?)\[/ACTION\]', re.DOTALL)
+        # Text of the current thinking step, joined only when it is sent
+        thinking_parts: List[str] = []
+        thinking_has_text = False
+        # Splits the stream into plain text and ACTION payloads in a single pass
+        scanner = ActionStreamScanner()
+        clean_parts: List[str] = []
         
         # Process streaming output
-        while not task.done() or not token_queue.empty():
+        async for token in _stream_model_tokens(system_prompt, user_message, extras, model, temperature):
             try:
-                # Get token from queue in non-blocking way
-                token = await asyncio.wait_for(token_queue.get(), timeout=0.1)
-                thinking_buffer += token
+                # Separate ACTION blocks from plain text
+                text, action_contents = scanner.feed(token)
+                clean_parts.append(text)
+                thinking_parts.append(text)
+                thinking_has_text = thinking_has_text or bool(text.strip())
                 
                 # Check if there is a complete thinking step
-                if token in ['.', '?', '!', '\n'] and len(thinking_buffer.strip()) > 0:
-                    # Check if there is a complete or partial ACTION block
-                    # Remove complete ACTION block
-                    clean_thinking = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', thinking_buffer, flags=re.DOTALL)
-                    # Remove partial ACTION block (only start tag)
-                    clean_thinking = re.sub(r'\[ACTION\].*', '', clean_thinking, flags=re.DOTALL)
-                    # Remove partial ACTION block (only end tag)
-                    clean_thinking = re.sub(r'.*\[/ACTION\]', '', clean_thinking, flags=re.DOTALL)
-                    
-                    if clean_thinking.strip():
-                        # Send thinking message
-                        current_thinking = clean_thinking.strip()
-                        yield {"type": "message", "content": current_thinking}
+                if token and token[-1] in _SENT_END and thinking_has_text:
+                    # Send thinking message
+                    current_thinking = "".join(thinking_parts).strip()
+                    yield {"type": "message", "content": current_thinking}
                     
                     # Reset thinking buffer
-                    thinking_buffer = ""
+                    thinking_parts = []
+                    thinking_has_text = False
                 
-                # Check if there is a complete ACTION block
-                action_matches = action_pattern.findall(thinking_buffer)
-                if action_matches:
-                    for action_content in action_matches:
-                        try:
-                            # Parse action content as JSON
-                            action_json = json.loads(action_content.strip())
-                            
-                            # Send action message
-                            yield {"type": "action", "content": "Content generation completed, ready to be inserted into the editor.", "action": action_json}
-                            
-                            # Remove processed action from buffer
-                            thinking_buffer = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', thinking_buffer, flags=re.DOTALL)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, just continue
-                            logger.warning(f"Failed to parse action JSON: {action_content}")
-            except asyncio.TimeoutError:
-                # No token available, just continue
-                pass
+                # Send each ACTION block as soon as it is closed
+                for action_content in action_contents:
+                    try:
+                        # Parse action content as JSON
+                        action_json = json.loads(action_content.strip())
+                        
+                        # Send action message
+                        yield {"type": "action", "content": "Content generation completed, ready to be inserted into the editor.", "action": action_json}
+                    except json.JSONDecodeError:
+                        # If JSON parsing fails, just continue
+                        logger.warning(f"Failed to parse action JSON: {action_content}")
             except Exception as e:
                 # Log error and continue
                 logger.error(f"Error processing token: {e}", exc_info=True)
         
-        # Process any remaining thinking buffer
-        if thinking_buffer.strip():
-            # Remove any ACTION blocks
-            clean_thinking = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', thinking_buffer, flags=re.DOTALL)
-            clean_thinking = re.sub(r'\[ACTION\].*', '', clean_thinking, flags=re.DOTALL)
-            clean_thinking = re.sub(r'.*\[/ACTION\]', '', clean_thinking, flags=re.DOTALL)
-            
-            if clean_thinking.strip():
-                # Send final thinking message
-                yield {"type": "message", "content": clean_thinking.strip()}
-        
-        # Wait for the model task to complete
-        await task
-        
-        # Get the final response from the model
-        response = task.result()
-        
-        # Check if there are any ACTION blocks in the final response that weren't caught by streaming
-        content = response.content
-        action_matches = action_pattern.findall(content)
-        
-        if action_matches:
-            for action_content in action_matches:
-                try:
-                    # Parse action content as JSON
-                    action_json = json.loads(action_content.strip())
-                    
-                    # Send action message
-                    yield {"type": "action", "content": "Content generation completed, ready to be inserted into the editor.", "action": action_json}
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, just continue
-                    logger.warning(f"Failed to parse action JSON: {action_content}")
+        # Process any remaining thinking buffer (an unterminated ACTION block is dropped)
+        text = scanner.flush()
+        clean_parts.append(text)
+        thinking_parts.append(text)
+        remaining_thinking = "".join(thinking_parts).strip()
+        if remaining_thinking:
+            # Send final thinking message
+            yield {"type": "message", "content": remaining_thinking}
         
         # Send final message without ACTION blocks
-        clean_content = re.sub(r'\[ACTION\].*?\[/ACTION\]', '', content, flags=re.DOTALL)
+        clean_content = "".join(clean_parts)
         if clean_content.strip() and clean_content.strip() != current_thinking:
             # Only send if it's different from the last thinking message
             yield {"type": "message", "content": clean_content.strip()}
@@ -5,7 +5,7 @@
 import asyncio
 from typing import Dict, Any, AsyncGenerator, Optional
 from app.features.intent_analysis.services.intent_service import identify_document_intent
-from app.features.intent_analysis.services.top_level_intent_service import identify_top_level_intent, TopLevelIntent
+from app.features.intent_analysis.services.top_level_intent_service import identify_top_level_intent, TopLevelIntent, format_top_level_intent
 from app.features.intent_analysis.services.modify_existing_intent_service import identify_modify_existing_intent
 from app.features.document_editing.services.target_service import identify_text_target
 from app.features.document_editing.services.action_service import plan_edit_actions
@@ -32,29 +32,36 @@ async def process_user_input(
     # 阶段1: 意图识别（顶层和二级意图）
     if top_level_intent:
         # 如果已有顶层意图，直接使用
-        yield {"type": "thinking", "content": f"已识别您的意图：{top_level_intent.intent_type}（置信度 {top_level_intent.confidence:.2f}）"}
+        yield {"type": "thinking", "content": format_top_level_intent(top_level_intent)}
     else:
         # 否则重新识别顶层意图
         yield {"type": "thinking", "content": "正在分析您的请求..."}
         top_level_intent = await identify_top_level_intent(user_message)
-        yield {"type": "thinking", "content": f"已识别您的意图：{top_level_intent.intent_type}（置信度 {top_level_intent.confidence:.2f}）"}
+        yield {"type": "thinking", "content": format_top_level_intent(top_level_intent)}
     
-    # 根据顶层意图类型，获取二级意图
-    if top_level_intent.intent_type == "modify_existing":
-        # 获取修改意图的详细信息
-        modify_intent = await identify_modify_existing_intent(user_message)
-        yield {"type": "thinking", "content": f"修改类型：{modify_intent.action}，内容：{modify_intent.content}"}
-        # 使用修改意图的内容进行后续处理
-        intent_type = "section_edit"  # 默认使用section_edit作为文档类型
-    else:
-        # 对于其他类型，使用文档类型意图识别
-        doc_intent = await identify_document_intent(user_message)
-        yield {"type": "thinking", "content": f"文档类型：{doc_intent.document_type}（置信度 {doc_intent.confidence:.2f}）"}
-        intent_type = doc_intent.document_type
-    
-    # 阶段2: 文本目标定位
-    yield {"type": "thinking", "content": "正在定位编辑目标..."}
-    target = await identify_text_target(user_message, editor_content, selected_text)
+    # 文本目标定位不依赖意图类型，与二级意图识别并发执行
+    target_task = asyncio.create_task(identify_text_target(user_message, editor_content, selected_text))
+    try:
+        # 根据顶层意图类型，获取二级意图
+        if top_level_intent.intent_type == "modify_existing":
+            # 获取修改意图的详细信息
+            modify_intent = await identify_modify_existing_intent(user_message)
+            yield {"type": "thinking", "content": f"修改类型：{modify_intent.action}，内容：{modify_intent.content}"}
+            # 使用修改意图的内容进行后续处理
+            intent_type = "section_edit"  # 默认使用section_edit作为文档类型
+        else:
+            # 对于其他类型，使用文档类型意图识别
+            doc_intent = await identify_document_intent(user_message)
+            yield {"type": "thinking", "content": f"文档类型：{doc_intent.document_type}（置信度 {doc_intent.confidence:.2f}）"}
+            intent_type = doc_intent.document_type
+        
+        # 阶段2: 文本目标定位
+        yield {"type": "thinking", "content": "正在定位编辑目标..."}
+        target = await target_task
+    finally:
+        # 出错或调用方提前关闭生成器时，不留下悬空的定位请求
+        if not target_task.done():
+            target_task.cancel()
     if target.target_type == 'selected_text':
         yield {"type": "thinking", "content": "目标：选中的文本"}
     elif target.target_type == 'whole_content':
@@ -76,7 +83,8 @@ async def process_user_input(
     # 使用执行服务将动作应用到目标内容
     updated = await execute_actions(
         original_content=target.content or "",
-        actions=[plan.dict() for plan in actions]
+        # execute_actions 只读取 type 和 payload，直接取属性而不做整个模型的序列化
+        actions=[{"type": plan.type, "payload": plan.payload} for plan in actions]
     )
     # 输出最终编辑动作，将整个目标内容替换
     yield {"type": "action", "content": "编辑已应用", "action": {"type": "replace_all", "payload": {"content": updated}}}
@@ -6,7 +6,6 @@ converting user prompts into image data and preparing the editor actions.
 """
 from typing import Dict, Any, Optional
 import logging
-import base64
 
 from app.features.processing.image_insertion_service import ImageInsertionService
 from app.models.editor_actions import create_action
@@ -4,7 +4,8 @@ Image Insertion Processing Service
 This module encapsulates functionality for handling image insertion in documents.
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from functools import lru_cache
 import os
 import json
 import asyncio
@@ -13,6 +14,7 @@ from app.config import settings
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from .images.openai_generator import OpenAIImageGenerator
+from .prompt_cache import PromptOptimizationCache
 
 # 配置日志记录
 logger = logging.getLogger(__name__)
@@ -20,14 +22,119 @@ logger = logging.getLogger(__name__)
 # 使用全局配置
 api_key = settings.openai_api_key
 image_model = settings.openai_image_model
+# 提示词优化使用聊天模型（图像模型不能处理聊天请求）
+prompt_model = settings.openai_chat_model
+
+# 限制同时进行的提示词优化请求数，避免突发流量触发速率限制
+_OPENAI_SEM = asyncio.Semaphore(settings.openai_max_concurrency)
+
+# 提示词优化的采样温度；非零温度让重复请求得到不同的优化结果
+_PROMPT_TEMPERATURE = 0.7
+
+# 优化后的提示词缓存，仅在温度约为0时复用相同用户提示词的优化结果
+_AESTHETIC_PROMPT_CACHE = PromptOptimizationCache("aesthetic", prompt_model, _PROMPT_TEMPERATURE)
+_DIAGRAM_PROMPT_CACHE = PromptOptimizationCache("diagram", prompt_model, _PROMPT_TEMPERATURE)
+
+# 客户端在模块加载时创建一次，所有请求复用其连接池
+_CHAT_MODEL = ChatOpenAI(
+    api_key=api_key,  # 使用全局API密钥
+    model=prompt_model,
+    temperature=_PROMPT_TEMPERATURE,
+    max_retries=settings.openai_max_retries
+)
+_IMG_GEN = OpenAIImageGenerator(api_key=api_key, model=image_model)
+
+# 提示词优化的固定说明放在系统消息中，用户提示词单独作为用户消息发送；
+# 每次请求的前缀完全相同，可以命中 OpenAI 的提示词前缀缓存
+_DIAGRAM_SYSTEM_MESSAGE = SystemMessage(content="""You are a professional vector diagram generation expert. Please transform the user's original prompt, given in the user message, into a structured, detailed, and concise vector diagram drawing prompt, requiring the following elements:
+
+1. **Subject**  
+   - Briefly summarize the core concept or process to be conveyed in the diagram.
+
+2. **Style**  
+   - Clearly specify style keywords such as "vector infographic," "flat design," "technical illustration," etc.
+
+3. **Composition**  
+   - The number, arrangement, and connection relationships of layers, arrows, and labels.  
+   - Whether semi-transparent, solid, grid-aligned, or other effects are needed.
+
+4. **Color Palette**  
+   - Recommend which primary colors to use, and whether to adopt high-contrast, flat, or corporate colors.
+
+5. **Format & Quality**  
+   - Resolution (e.g., 4K), file format (e.g., SVG), canvas aspect ratio (e.g., 16:9), etc.
+
+Please integrate the above elements into a single complete prompt so that it can be directly used to call the AI to generate a high-quality vector diagram.""")
+
+_AESTHETIC_SYSTEM_MESSAGE = SystemMessage(content="""You are an expert image-generation orchestrator. Given a user's original prompt in the user message, first detect their intent:
+
+1. **Vector Diagram**: schematic, flowchart, infographic, or other diagrammatic illustration.  
+2. **Photography**: realistic photo taken with a camera or mobile device.  
+3. **Photorealistic CG**: full 3D render or CGI that mimics reality.  
+4. **Illustration / Digital Painting**: artistic drawing, painting, or sketch.
+
+Then, based on the detected intent, transform the user's prompt into a single, structured, detailed, and concise prompt optimized for that category:
+
+---
+
+**If Vector Diagram:**  
+• **Subject**: brief core concept or process.  
+• **Style**: "vector infographic," "flat design," "technical illustration."  
+• **Composition**: layers, arrows, labels, alignment, transparency.  
+• **Color Palette**: primary colors, contrast level.  
+• **Format & Quality**: resolution (e.g. 4K), format (SVG), aspect ratio (16:9).
+
+**If Photography:**  
+- **DSLR/Mirrorless Photo:**  
+  1. **Camera & Lens**: e.g. "Canon EOS R5, 85 mm f/1.2."  
+  2. **Lighting**: e.g. "golden-hour backlight with softbox fill."  
+  3. **Composition**: rule of thirds, shallow depth of field, bokeh.  
+  4. **Post-Processing**: film simulation (e.g. "Kodak Portra 400"), subtle color grading.  
+
+- **Mobile / Social-Style Photo:**  
+  1. **Phone Model & Specs**: e.g. "iPhone 15 Pro, 1.9 μm pixel sensor, ƒ/1.6."  
+  2. **Depth & Bokeh**: "Portrait Mode shallow depth of field, smooth bokeh."  
+  3. **Filter & Texture**: "Snapchat-style warm filter, slight film grain, soft vignette."  
+  4. **Lighting & Framing**: "natural window light, candid framing, rule of thirds."  
+  5. **Post-Processing**: enhanced saturation, subtle skin smoothing, light flares.
+
+**If Photorealistic CG:**  
+1. **Render Engine & Settings**: e.g. "Octane, unbiased path-tracing, 1024 samples."  
+2. **Materials & Textures**: PBR materials, 8K textures, subsurface scattering.  
+3. **Lighting**: HDRI environment, three-point soft light.  
+4. **Camera**: "35 mm f/2.8, 1/100 s, ISO 100."  
+5. **Post-Processing**: realistic color grading, lens flares, film grain.
+
+**If Illustration / Digital Painting:**  
+1. **Style & Medium**: e.g. "digital oil painting," "watercolor sketch."  
+2. **Brushwork & Texture**: "visible brush strokes," "canvas texture overlay."  
+3. **Color & Mood**: "warm pastel palette," "dramatic chiaroscuro."  
+4. **Composition & Focus**: dynamic perspective, dramatic lighting, hand-painted details.
+
+---
+
+**Final Output:**  
+Return exactly one prompt string, fully assembled according to the detected category, ready for direct submission to the AI image-generation engine.""")
+
+# 各图像类型生成的 alt 文本前缀
+_ALT_TEXT_PREFIXES = {
+    "aesthetic": "Generated image based on: ",
+    "diagram": "Generated diagram based on: ",
+}
+
+@lru_cache(maxsize=16)
+def _parse_size(size: str) -> Tuple[int, int]:
+    """把"1024x1024"形式的尺寸解析为 (宽, 高)"""
+    width, height = map(int, size.split("x"))
+    return width, height
 
 class ImageInsertionService:
     """Service to process and insert images into documents."""
     
     def __init__(self):
         """Initialize the image insertion service."""
-        # 无需在此保存模型，直接在调用时传参
-        pass
+        # 复用模块级的图像生成客户端
+        self.generator = _IMG_GEN
     
     async def generate_image(self, message: str, image_type: str = "aesthetic", **kwargs) -> dict:
         """
@@ -51,48 +158,7 @@ class ImageInsertionService:
         :param message: 用户输入的提示词
         :return: 包含图像数据或URL的字典
         """
-        # 步骤1: 优化用户的原始提示词为更结构化的提示词
-        optimized_prompt = await self._optimize_aesthetic_prompt(message)
-        
-        # 记录优化后的提示词，便于调试
-        logger.info(f"优化后的图像提示词: {optimized_prompt[:100]}...")
-        
-        # 步骤2: 调用 OpenAI 图像生成
-        generator = OpenAIImageGenerator(api_key=api_key, model=image_model)
-        size = kwargs.get("size", "1024x1024")
-        n = kwargs.get("n", 1)
-        # 调用图像生成API
-        resp = await generator.generate_image(optimized_prompt, n=n, size=size)
-        
-        # 从响应中提取 base64 数据
-        if "data" in resp and len(resp["data"]) > 0:
-            image_data = resp["data"][0]
-            # 提取宽度和高度
-            width, height = map(int, size.split("x"))
-            
-            # 检查是否有 base64 数据
-            if "b64_json" in image_data and image_data["b64_json"] is not None and len(image_data["b64_json"]) > 0:
-                # 返回包含 base64 数据的字典
-                return {
-                    "image_data": image_data["b64_json"],
-                    "alt_text": f"Generated image based on: {message}",
-                    "width": width,
-                    "height": height,
-                    "format": "png",
-                    "is_base64": True
-                }
-            # 兼容 URL 格式
-            elif "url" in image_data:
-                return {
-                    "image_url": image_data["url"],
-                    "alt_text": f"Generated image based on: {message}",
-                    "width": width,
-                    "height": height,
-                    "format": "png"
-                }
-        
-        # 如果无法提取数据，抛出异常
-        raise ValueError(f"Failed to extract image data from response: {resp}")
+        return await self._generate("aesthetic", message, **kwargs)
     
     async def generate_diagram_image(self, message: str, **kwargs) -> dict:
         """
@@ -101,31 +167,43 @@ class ImageInsertionService:
         :param message: 用户输入的提示词
         :return: 包含图像数据或URL的字典
         """
+        return await self._generate("diagram", message, **kwargs)
+    
+    async def _generate(self, kind: str, message: str, **kwargs) -> dict:
+        """
+        优化提示词并生成图像，两种图像类型共用的流程
+        
+        :param kind: 图像类型，"aesthetic"或"diagram"
+        :param message: 用户输入的提示词
+        :return: 包含图像数据或URL的字典
+        """
+        optimizer = self._optimize_aesthetic_prompt if kind == "aesthetic" else self._optimize_diagram_prompt
+        alt_prefix = _ALT_TEXT_PREFIXES[kind]
+        
         # 步骤1: 优化用户的原始提示词为更结构化的提示词
-        optimized_prompt = await self._optimize_diagram_prompt(message)
+        optimized_prompt = await optimizer(message)
         
         # 记录优化后的提示词，便于调试
-        print(f"优化后的图表提示词: {optimized_prompt}")
+        logger.info(f"优化后的{kind}提示词: {optimized_prompt[:100]}...")
         
         # 步骤2: 调用 OpenAI 图像生成
-        generator = OpenAIImageGenerator(api_key=api_key, model=image_model)
         size = kwargs.get("size", "1024x1024")
         n = kwargs.get("n", 1)
         # 调用图像生成API
-        resp = await generator.generate_image(optimized_prompt, n=n, size=size)
+        resp = await self._generate_images(optimized_prompt, n=n, size=size)
         
         # 从响应中提取 base64 数据
         if "data" in resp and len(resp["data"]) > 0:
             image_data = resp["data"][0]
             # 提取宽度和高度
-            width, height = map(int, size.split("x"))
+            width, height = _parse_size(size)
             
             # 检查是否有 base64 数据
             if "b64_json" in image_data and image_data["b64_json"] is not None and len(image_data["b64_json"]) > 0:
                 # 返回包含 base64 数据的字典
                 return {
                     "image_data": image_data["b64_json"],
-                    "alt_text": f"Generated diagram based on: {message}",
+                    "alt_text": f"{alt_prefix}{message}",
                     "width": width,
                     "height": height,
                     "format": "png",
@@ -135,7 +213,7 @@ class ImageInsertionService:
             elif "url" in image_data:
                 return {
                     "image_url": image_data["url"],
-                    "alt_text": f"Generated diagram based on: {message}",
+                    "alt_text": f"{alt_prefix}{message}",
                     "width": width,
                     "height": height,
                     "format": "png"
@@ -144,6 +222,22 @@ class ImageInsertionService:
         # 如果无法提取数据，抛出异常
         raise ValueError(f"Failed to extract image data from response: {resp}")
     
+    async def _generate_images(self, prompt: str, n: int, size: str) -> dict:
+        """
+        生成 n 张图像，n>1 时拆成 n 个并发的单张请求并合并结果
+        
+        :param prompt: 图像提示词
+        :param n: 图像数量
+        :param size: 图像尺寸，如"1024x1024"
+        :return: 标准化的响应 {"data": [...]}
+        """
+        if n <= 1:
+            return await self.generator.generate_image(prompt, n=n, size=size)
+        responses = await asyncio.gather(
+            *(self.generator.generate_image(prompt, n=1, size=size) for _ in range(n))
+        )
+        return {"data": [item for resp in responses for item in resp.get("data", [])]}
+    
     async def _optimize_diagram_prompt(self, user_prompt: str) -> str:
         """
         将用户的原始提示词优化为更结构化的图表生成提示词
@@ -153,53 +247,27 @@ class ImageInsertionService:
         """
         # 这里可以调用LLM来优化提示词
         # 在实际实现中，应该使用项目中已有的LLM服务
-        
-        # 优化提示词模板
-        optimization_prompt = f"""You are a professional vector diagram generation expert. Please transform the following user's original prompt:  
-"{user_prompt}"  
-into a structured, detailed, and concise vector diagram drawing prompt, requiring the following elements:
-
-1. **Subject**  
-   - Briefly summarize the core concept or process to be conveyed in the diagram.
-
-2. **Style**  
-   - Clearly specify style keywords such as "vector infographic," "flat design," "technical illustration," etc.
-
-3. **Composition**  
-   - The number, arrangement, and connection relationships of layers, arrows, and labels.  
-   - Whether semi-transparent, solid, grid-aligned, or other effects are needed.
-
-4. **Color Palette**  
-   - Recommend which primary colors to use, and whether to adopt high-contrast, flat, or corporate colors.
-
-5. **Format & Quality**  
-   - Resolution (e.g., 4K), file format (e.g., SVG), canvas aspect ratio (e.g., 16:9), etc.
-
-Please integrate the above elements into a single complete prompt so that it can be directly used to call the AI to generate a high-quality vector diagram."""
+        cached_prompt = await _DIAGRAM_PROMPT_CACHE.get(user_prompt)
+        if cached_prompt is not None:
+            return cached_prompt
         
         # 使用OpenAI API调用o4-mini模型优化提示词
         try:
-            # 创建ChatOpenAI实例
-            chat_model = ChatOpenAI(
-                api_key=api_key,  # 使用全局API密钥
-                model=self.default_model,
-                temperature=0.7,
-                verbose=True
-            )
-            
             # 准备消息
             messages = [
-                SystemMessage(content="You are a professional vector diagram generation expert."),
-                HumanMessage(content=optimization_prompt)
+                _DIAGRAM_SYSTEM_MESSAGE,
+                HumanMessage(content=user_prompt)
             ]
             
             # 调用API
             logger.info(f"Calling OpenAI API to optimize diagram prompt for: {user_prompt[:50]}...")
-            response = chat_model.invoke(messages)
+            async with _OPENAI_SEM:
+                response = await _CHAT_MODEL.ainvoke(messages)
             
             # 提取响应内容
             optimized_prompt = response.content
             logger.info(f"Successfully optimized diagram prompt")
+            await _DIAGRAM_PROMPT_CACHE.set(user_prompt, optimized_prompt)
             
         except Exception as e:
             # 如果调用失败，记录错误并使用默认提示词
@@ -216,79 +284,26 @@ Please integrate the above elements into a single complete prompt so that it can
         :param user_prompt: 用户的原始提示词
         :return: 优化后的提示词
         """
-        # 优化提示词模板
-        optimization_prompt = f"""You are an expert image-generation orchestrator. Given a user's original prompt "{user_prompt}", first detect their intent:
-
-1. **Vector Diagram**: schematic, flowchart, infographic, or other diagrammatic illustration.  
-2. **Photography**: realistic photo taken with a camera or mobile device.  
-3. **Photorealistic CG**: full 3D render or CGI that mimics reality.  
-4. **Illustration / Digital Painting**: artistic drawing, painting, or sketch.
-
-Then, based on the detected intent, transform "{user_prompt}" into a single, structured, detailed, and concise prompt optimized for that category:
-
----
-
-**If Vector Diagram:**  
-• **Subject**: brief core concept or process.  
-• **Style**: "vector infographic," "flat design," "technical illustration."  
-• **Composition**: layers, arrows, labels, alignment, transparency.  
-• **Color Palette**: primary colors, contrast level.  
-• **Format & Quality**: resolution (e.g. 4K), format (SVG), aspect ratio (16:9).
-
-**If Photography:**  
-- **DSLR/Mirrorless Photo:**  
-  1. **Camera & Lens**: e.g. "Canon EOS R5, 85 mm f/1.2."  
-  2. **Lighting**: e.g. "golden-hour backlight with softbox fill."  
-  3. **Composition**: rule of thirds, shallow depth of field, bokeh.  
-  4. **Post-Processing**: film simulation (e.g. "Kodak Portra 400"), subtle color grading.  
-
-- **Mobile / Social-Style Photo:**  
-  1. **Phone Model & Specs**: e.g. "iPhone 15 Pro, 1.9 μm pixel sensor, ƒ/1.6."  
-  2. **Depth & Bokeh**: "Portrait Mode shallow depth of field, smooth bokeh."  
-  3. **Filter & Texture**: "Snapchat-style warm filter, slight film grain, soft vignette."  
-  4. **Lighting & Framing**: "natural window light, candid framing, rule of thirds."  
-  5. **Post-Processing**: enhanced saturation, subtle skin smoothing, light flares.
-
-**If Photorealistic CG:**  
-1. **Render Engine & Settings**: e.g. "Octane, unbiased path-tracing, 1024 samples."  
-2. **Materials & Textures**: PBR materials, 8K textures, subsurface scattering.  
-3. **Lighting**: HDRI environment, three-point soft light.  
-4. **Camera**: "35 mm f/2.8, 1/100 s, ISO 100."  
-5. **Post-Processing**: realistic color grading, lens flares, film grain.
-
-**If Illustration / Digital Painting:**  
-1. **Style & Medium**: e.g. "digital oil painting," "watercolor sketch."  
-2. **Brushwork & Texture**: "visible brush strokes," "canvas texture overlay."  
-3. **Color & Mood**: "warm pastel palette," "dramatic chiaroscuro."  
-4. **Composition & Focus**: dynamic perspective, dramatic lighting, hand-painted details.
-
----
-
-**Final Output:**  
-Return exactly one prompt string, fully assembled according to the detected category, ready for direct submission to the AI image-generation engine."""
+        cached_prompt = await _AESTHETIC_PROMPT_CACHE.get(user_prompt)
+        if cached_prompt is not None:
+            return cached_prompt
         
         try:
-            # 创建ChatOpenAI实例
-            chat_model = ChatOpenAI(
-                api_key=api_key,  # 使用全局API密钥
-                model=image_model,
-                temperature=0.7,
-                verbose=True
-            )
-            
             # 准备消息
             messages = [
-                SystemMessage(content="You are an expert image-generation orchestrator."),
-                HumanMessage(content=optimization_prompt)
+                _AESTHETIC_SYSTEM_MESSAGE,
+                HumanMessage(content=user_prompt)
             ]
             
             # 调用API
             logger.info(f"Calling OpenAI API to optimize aesthetic image prompt for: {user_prompt[:50]}...")
-            response = chat_model.invoke(messages)
+            async with _OPENAI_SEM:
+                response = await _CHAT_MODEL.ainvoke(messages)
             
             # 提取响应内容
             optimized_prompt = response.content
             logger.info(f"Successfully optimized aesthetic image prompt")
+            await _AESTHETIC_PROMPT_CACHE.set(user_prompt, optimized_prompt)
             
         except Exception as e:
             # 如果调用失败，记录错误并使用默认提示词
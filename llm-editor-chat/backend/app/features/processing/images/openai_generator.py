@@ -1,11 +1,14 @@
 import os
 import asyncio
 from typing import Any, Dict
-from openai import OpenAI
+import httpx
+from openai import OpenAI, DefaultHttpxClient
 
 from .base import BaseImageGenerator
 from app.config import settings
 
+# 限制同时进行的图像生成请求数，避免突发流量触发速率限制
+_OPENAI_SEM = asyncio.Semaphore(settings.openai_max_concurrency)
 
 class OpenAIImageGenerator(BaseImageGenerator):
     """
@@ -16,7 +19,15 @@ class OpenAIImageGenerator(BaseImageGenerator):
         # 初始化 OpenAI 客户端，默认使用 gpt-image-1 模型
         # 直接使用传入的 api_key，否则从全局配置读取
         key = api_key or settings.openai_api_key
-        self.client = OpenAI(api_key=key)
+        # 429 和 5xx 由 SDK 按指数退避（带抖动）自动重试
+        # 保持长连接，多个请求复用同一连接池
+        self.client = OpenAI(
+            api_key=key,
+            max_retries=settings.openai_max_retries,
+            http_client=DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        )
         self.model = model
 
     async def generate_image(self, prompt: str, n: int = 1, size: str = "1024x1024", **kwargs: Any) -> Dict[str, Any]:
@@ -41,9 +52,10 @@ class OpenAIImageGenerator(BaseImageGenerator):
             }
                 
             # 调用 API
-            response = await asyncio.to_thread(
-                lambda: self.client.images.generate(**valid_params)
-            )
+            async with _OPENAI_SEM:
+                response = await asyncio.to_thread(
+                    lambda: self.client.images.generate(**valid_params)
+                )
             
             # 将响应转换为标准格式
             return self._standardize_response(response)
@@ -65,52 +77,18 @@ class OpenAIImageGenerator(BaseImageGenerator):
         }
         """
         try:
-            # 检查是否是对象形式的响应
-            if hasattr(response, "data") and hasattr(response.data, "__iter__"):
-                # 新版 OpenAI API 返回对象
-                result = []
-                for item in response.data:
-                    data_item = {}
-                    # 检查是否有 b64_json 属性
-                    if hasattr(item, "b64_json") and item.b64_json is not None and item.b64_json != "":
-                        data_item["b64_json"] = item.b64_json
-                    # 检查是否有 url 属性（兼容旧版）
-                    elif hasattr(item, "url"):
-                        data_item["url"] = item.url
-                    
-                    if data_item:  # 只添加非空数据
-                        result.append(data_item)
-                        
-                return {"data": result}
-            
-            # 检查是否是字典形式的响应
-            elif isinstance(response, dict) and "data" in response:
-                # 已经是字典格式，直接返回
+            # 字典形式的响应（旧版 SDK 或模拟客户端）已经是标准格式，直接返回
+            if isinstance(response, dict) and "data" in response:
                 return response
             
-            # 其他情况，尝试转换为字典
-            else:
-                if hasattr(response, "__dict__"):
-                    resp_dict = response.__dict__
-                    if "_data" in resp_dict:
-                        data = resp_dict["_data"]
-                        result = []
-                        for item in data:
-                            data_item = {}
-                            # 检查 b64_json 和 url 属性
-                            if hasattr(item, "b64_json") and item.b64_json is not None and item.b64_json != "":
-                                data_item["b64_json"] = item.b64_json
-                            elif hasattr(item, "url"):
-                                data_item["url"] = item.url
-                                
-                            if data_item:  # 只添加非空数据
-                                result.append(data_item)
-                                
-                        return {"data": result}
-            
-            # 如果无法识别格式，抛出异常
-            raise ValueError(f"Unrecognized response format: {response}")
-            
+            # SDK 返回 pydantic 模型，model_dump 由 pydantic-core 完成
+            data = response.model_dump().get("data") or []
+            # 优先使用 b64_json，没有时使用 url（兼容旧版），两者都没有的条目跳过
+            return {"data": [
+                {"b64_json": item["b64_json"]} if item.get("b64_json") else {"url": item["url"]}
+                for item in data
+                if item.get("b64_json") or item.get("url")
+            ]}
         except Exception as e:
             import logging
             logging.error(f"Error standardizing response: {str(e)}\nResponse: {response}")
@@ -0,0 +1,73 @@
+"""
+Prompt optimization cache
+
+Caches the image prompts produced by the LLM prompt optimizers in
+ImageInsertionService. Only exact repeats (after whitespace/case
+normalization) are reused: a similar but different request ("a red cat" vs.
+"a blue cat") must not receive another request's optimized prompt. Prompts
+sampled at a non-zero temperature are never cached, so repeats keep their
+variety.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+from app.utils.cache_utils import make_cache_key, is_deterministic
+from app.utils.response_cache import SQLiteResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Shares the response cache database (and its LRU budget) with the LLM services
+_PROMPT_RESPONSE_CACHE = SQLiteResponseCache(
+    settings.llm_cache_db,
+    ttl=settings.llm_cache_ttl,
+    max_entries=settings.llm_cache_max_entries
+)
+
+
+class PromptOptimizationCache:
+    """Exact-match cache of optimized prompts for one image type and model"""
+
+    def __init__(
+        self,
+        kind: str,
+        model: str,
+        temperature: float,
+        cache: Optional[SQLiteResponseCache] = None
+    ):
+        """
+        Args:
+            kind: Image type the prompts are optimized for ("aesthetic", "diagram")
+            model: Chat model that produces the optimized prompts
+            temperature: Sampling temperature of that model; caching is off unless it is ~0
+            cache: Backing store; defaults to the shared response cache database
+        """
+        self.kind = kind
+        self.model = model
+        self.enabled = is_deterministic(temperature)
+        self._cache = cache if cache is not None else _PROMPT_RESPONSE_CACHE
+
+    def _key(self, user_prompt: str) -> str:
+        normalized = " ".join(user_prompt.split()).lower()
+        return make_cache_key(["image_prompt", self.kind, self.model, normalized])
+
+    async def get(self, user_prompt: str) -> Optional[str]:
+        """
+        Find the optimized prompt cached for the same user prompt
+
+        Returns:
+            The cached prompt, or None on a miss or when caching is disabled
+        """
+        if not (self.enabled and settings.llm_cache_enabled):
+            return None
+        cached = await asyncio.to_thread(self._cache.get, self._key(user_prompt))
+        if cached is not None:
+            logger.info(f"Prompt optimization cache hit ({self.kind})")
+        return cached
+
+    async def set(self, user_prompt: str, optimized_prompt: str) -> None:
+        """Cache an optimized prompt for a user prompt."""
+        if not (self.enabled and settings.llm_cache_enabled):
+            return
+        await asyncio.to_thread(self._cache.set, self._key(user_prompt), optimized_prompt)
@@ -2,7 +2,7 @@
 Pydantic models for the template feature.
 These models define the data structures for templates, template ratings, and template statistics.
 """
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from uuid import UUID
@@ -10,6 +10,8 @@ from uuid import UUID
 
 class TemplateBase(BaseModel):
     """Base model for template data."""
+    model_config = ConfigDict(frozen=True)
+    
     name: str = Field(..., description="Name of the template")
     prompt: str = Field(..., description="Template prompt content")
     category: List[str] = Field(default=[], description="Categories for the template")
@@ -26,6 +28,8 @@ class TemplateCreate(TemplateBase):
 
 class TemplateUpdate(BaseModel):
     """Model for updating an existing template."""
+    model_config = ConfigDict(frozen=True)
+    
     name: Optional[str] = None
     prompt: Optional[str] = None
     category: Optional[List[str]] = None
@@ -37,6 +41,8 @@ class TemplateUpdate(BaseModel):
 
 class TemplateCreator(BaseModel):
     """Model for template creator information."""
+    model_config = ConfigDict(frozen=True)
+    
     id: UUID
     email: Optional[str] = None
     display_name: Optional[str] = None
@@ -56,24 +62,23 @@ class TemplateResponse(TemplateBase):
     avg_rating: Optional[float] = 0
     rating_count: Optional[int] = 0
     
-    class Config:
-        orm_mode = True
+    # Merged with TemplateBase's config, so instances stay frozen
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TemplateRatingCreate(BaseModel):
     """Model for creating a new template rating."""
+    model_config = ConfigDict(frozen=True)
+    
+    # ge/le are enforced by pydantic-core; no extra validator needed
     rating: int = Field(..., ge=1, le=5, description="Rating value from 1 to 5")
     feedback: Optional[str] = None
-    
-    @validator('rating')
-    def rating_must_be_valid(cls, v):
-        if v < 1 or v > 5:
-            raise ValueError('Rating must be between 1 and 5')
-        return v
 
 
 class TemplateStats(BaseModel):
     """Model for template statistics."""
+    model_config = ConfigDict(frozen=True)
+    
     template_id: UUID
     use_count: int = 0
     success_rate: float = 0
@@ -84,6 +89,8 @@ class TemplateStats(BaseModel):
 
 class TemplateSearchParams(BaseModel):
     """Model for template search parameters."""
+    model_config = ConfigDict(frozen=True)
+    
     search_term: Optional[str] = None
     category: Optional[str] = None
     visibility: str = "public"
@@ -6,6 +6,7 @@ import re
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 from datetime import datetime, timedelta
+from pydantic import TypeAdapter
 
 from app.core.supabase import get_supabase_client
 from app.features.templates.models import (
@@ -16,6 +17,12 @@ from app.features.templates.models import (
     TemplateSearchParams
 )
 
+# Validates a whole page of template rows in one pydantic-core call
+_TEMPLATE_LIST_ADAPTER = TypeAdapter(List[TemplateResponse])
+
+# {{variable_name}} placeholders; the negated class keeps matching linear
+_VARIABLE_RE = re.compile(r'{{([^{}]+)}}')
+
 
 class TemplateService:
     """Service for template operations using Supabase."""
@@ -66,7 +73,7 @@ class TemplateService:
                     {"search_term": params.search_term, "user_id": user_id or ""}
                 ).execute()
                 if not response.error:
-                    return [TemplateResponse(**template) for template in response.data]
+                    return _TEMPLATE_LIST_ADAPTER.validate_python(response.data)
             except Exception as e:
                 # Log error and fall back to basic filtering
                 print(f"Error using search_templates RPC: {e}")
@@ -85,7 +92,7 @@ class TemplateService:
             return []
         
         # Convert to TemplateResponse objects
-        return [TemplateResponse(**template) for template in response.data]
+        return _TEMPLATE_LIST_ADAPTER.validate_python(response.data)
     
     async def create_template(
         self, 
@@ -391,7 +398,7 @@ class TemplateService:
             ).execute()
             
             if not response.error:
-                return [TemplateResponse(**template) for template in response.data]
+                return _TEMPLATE_LIST_ADAPTER.validate_python(response.data)
         except Exception as e:
             # Log error and fall back to basic query
             print(f"Error using get_trending_templates RPC: {e}")
@@ -413,7 +420,7 @@ class TemplateService:
             print(f"Error fetching trending templates: {response.error}")
             return []
         
-        return [TemplateResponse(**template) for template in response.data]
+        return _TEMPLATE_LIST_ADAPTER.validate_python(response.data)
     
     def _extract_variables(self, prompt: str) -> List[str]:
         """
@@ -426,10 +433,8 @@ class TemplateService:
         Returns:
             List of variable names found in the prompt
         """
-        # Match {{variable_name}} pattern
-        matches = re.findall(r'{{([^{}]+)}}', prompt)
-        # Remove duplicates and return
-        return list(set(matches))
+        # Remove duplicates, keeping first-seen order
+        return list(dict.fromkeys(_VARIABLE_RE.findall(prompt)))
 
 
 # Create a singleton instance
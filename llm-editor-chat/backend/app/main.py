@@ -2,6 +2,9 @@ import argparse
 import os
 import sys
 import uvicorn
+from contextlib import asynccontextmanager
+from pathlib import Path
+from dotenv import load_dotenv
 from fastapi import FastAPI, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import (
@@ -9,7 +12,8 @@ from app.routers import (
     text_selection, 
     command_parsing
 )
-from app.features.llm import router as llm_router
+from app.features.llm.router import router as llm_router
+from app.features.llm.services.factory import LLMServiceFactory, get_default_llm_service
 from app.features.document_structure.router import router as document_structure_router
 from app.features.document_editing.router import router as document_editing_router
 from app.features.chat.router import router as chat_router
@@ -20,12 +24,27 @@ from app.logging_config import configure_logging
 from app.features.auth.config import auth_settings
 from app.features.auth.middleware.csrf_middleware import csrf_protection
 
+# 加载 backend/.env（OPENAI_API_KEY 等），llm_service 在每次调用时读取
+load_dotenv(Path(__file__).parent.parent / ".env")
+
 # 配置日志系统
 configure_logging()
 
 # 应用运行模式
 APP_MODE = os.environ.get("APP_MODE", "web")  # 默认为 web 模式
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享的 LLM 服务，退出时统一关闭"""
+    # 整个进程复用同一个服务实例及其连接池
+    async with get_default_llm_service() as llm_service:
+        app.state.llm_service = llm_service
+        try:
+            yield
+        finally:
+            # 关闭其余共享的 LLM 服务实例（仅在进程退出时执行一次）
+            await LLMServiceFactory.close()
+
 def create_app(mode="web"):
     """
     创建 FastAPI 应用实例
@@ -36,7 +55,7 @@ def create_app(mode="web"):
     global APP_MODE
     APP_MODE = mode
     
-    app = FastAPI(title="LLM Editor API")
+    app = FastAPI(title="LLM Editor API", lifespan=lifespan)
     
     # 配置 CORS
     # 允许来自 localhost 的请求，无论是 web 还是 electron 模式
@@ -0,0 +1,38 @@
+"""
+缓存工具模块
+
+为LLM响应缓存生成稳定的缓存键。
+"""
+import hashlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is optional at runtime; fall back to the stdlib encoder
+    orjson = None
+    import json
+
+
+def make_cache_key(payload: Any) -> str:
+    """
+    Build a canonical sha256 cache key for a JSON-serializable payload
+
+    Keys are sorted so logically equal payloads hash the same. orjson emits
+    bytes directly, which skips the str -> UTF-8 encode step.
+
+    Args:
+        payload: JSON-serializable request data (messages, model, temperature, ...)
+
+    Returns:
+        Hex digest usable as a cache key
+    """
+    if orjson is not None:
+        data = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    else:
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_deterministic(temperature: float) -> bool:
+    """Whether identical prompts at this temperature can share or replay one response."""
+    return temperature <= 0.01
@@ -4,14 +4,37 @@
 提供图像处理相关的工具函数，如URL转base64等
 """
 
-import base64
+import asyncio
 import logging
+from collections import OrderedDict
 from typing import Optional, Tuple
 import aiohttp
 from io import BytesIO
 
+try:
+    import pybase64 as base64
+except ImportError:  # pybase64 (SIMD) is optional at runtime; fall back to the stdlib codec
+    import base64
+
 logger = logging.getLogger(__name__)
 
+# 最近转换过的图片按URL缓存 (base64, MIME类型)；图片较大，只保留少量条目
+_URL_CACHE_SIZE = 32
+_url_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+
+def _encode_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def _parse_data_uri(uri: str) -> Tuple[Optional[str], Optional[str]]:
+    """从 data:<mime>;base64,<data> 形式的URI中直接取出base64数据和MIME类型"""
+    header, sep, data = uri.partition(",")
+    if not sep or not header.endswith(";base64"):
+        return None, None
+    return data, header[len("data:"):-len(";base64")] or "image/png"
+
+
 async def url_to_base64(image_url: str) -> Tuple[Optional[str], Optional[str]]:
     """
     将图片URL转换为base64编码
@@ -19,6 +42,15 @@ async def url_to_base64(image_url: str) -> Tuple[Optional[str], Optional[str]]:
     :param image_url: 图片URL
     :return: (base64编码的图片数据, MIME类型)，如果失败则返回(None, None)
     """
+    # data URI 已经包含base64数据，无需下载
+    if image_url.startswith("data:"):
+        return _parse_data_uri(image_url)
+    
+    cached = _url_cache.get(image_url)
+    if cached is not None:
+        _url_cache.move_to_end(image_url)
+        return cached
+    
     try:
         async with aiohttp.ClientSession() as session:
             async with session.get(image_url) as response:
@@ -30,8 +62,12 @@ async def url_to_base64(image_url: str) -> Tuple[Optional[str], Optional[str]]:
                 image_data = await response.read()
                 content_type = response.headers.get('Content-Type', 'image/png')
                 
-                # 转换为base64
-                base64_data = base64.b64encode(image_data).decode('utf-8')
+                # 转换为base64；大图编码耗时较长，放到工作线程中避免阻塞事件循环
+                base64_data = await asyncio.to_thread(_encode_base64, image_data)
+                
+                _url_cache[image_url] = (base64_data, content_type)
+                if len(_url_cache) > _URL_CACHE_SIZE:
+                    _url_cache.popitem(last=False)
                 
                 # 返回带有MIME类型的base64数据
                 return base64_data, content_type
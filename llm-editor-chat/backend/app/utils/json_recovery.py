@@ -0,0 +1,88 @@
+"""
+JSON 恢复工具模块
+
+从LLM响应中提取JSON对象。响应通常已经是合法JSON，偶尔会带有```json代码块或前后说明文字。
+"""
+from typing import Any, Dict
+
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional at runtime; fall back to the stdlib parser
+    import json as _json
+
+
+def _find_json_object(text: str) -> str:
+    """
+    Return the first balanced top-level JSON object in text, or "" if none
+
+    Tracks string/escape state so braces inside string values are ignored.
+    """
+    depth = 0
+    start = -1
+    in_str = False
+    esc = False
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == '\\':
+                esc = True
+            elif c == '"':
+                in_str = False
+            continue
+        if c == '"':
+            in_str = True
+        elif c == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif c == '}' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return ""
+
+
+def parse_llm_json(text: str) -> Dict[str, Any]:
+    """
+    Parse a JSON object out of an LLM response
+
+    The whole response is parsed directly first, which covers the common
+    json_object-mode case. Next the outermost braces are located at byte level
+    (bytes.find/rfind use memchr) and that slice is parsed, which covers ```json
+    fences and surrounding prose. Only if both fail does a string-aware scan look
+    for the first balanced object.
+
+    Args:
+        text: Raw LLM response text
+
+    Returns:
+        The parsed object, or an empty dict if no object could be parsed
+    """
+    try:
+        data = _json.loads(text)
+        if isinstance(data, dict):
+            return data
+    except _json.JSONDecodeError:
+        pass
+
+    raw = text.encode('utf-8')
+    start = raw.find(b'{')
+    end = raw.rfind(b'}')
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = _json.loads(raw[start:end + 1])
+        if isinstance(data, dict):
+            return data
+    except _json.JSONDecodeError:
+        pass
+
+    candidate = _find_json_object(text)
+    if not candidate:
+        return {}
+    try:
+        data = _json.loads(candidate)
+    except _json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
@@ -4,38 +4,35 @@ LLM 工具函数模块
 提供通用的LLM调用辅助函数，简化与OpenAI API的交互。
 """
 import logging
-from typing import List, Dict, AsyncGenerator, Union, Optional, Any
+from typing import List, Dict, AsyncGenerator, Union, Optional, Any, Type
+
+from pydantic import BaseModel
 
 from app.features.llm.services.factory import LLMServiceFactory
 from app.features.llm.services.base import LLMResponse
+from app.features.chat.state import get_current_intent
 
 logger = logging.getLogger(__name__)
 
-async def generate_text(
+def _build_messages(
     prompt: str,
-    system_message: str = "You are a helpful assistant.",
-    model: Optional[str] = None,
-    temperature: float = 0.7,
-    streaming: bool = True,
-    chat_history: Optional[List[Dict[str, str]]] = [],
-    **kwargs
-) -> str:
+    system_message: str,
+    chat_history: Optional[List[Dict[str, str]]] = None
+) -> List[Dict[str, str]]:
     """
-    Generate text using the LLM service
+    Build the message list for a single-prompt LLM call
+    
+    The system message always comes first and the prompt last, so callers that pass
+    a constant system message get a stable prefix for provider-side prompt caching.
     
     Args:
         prompt: User prompt/用户提示
         system_message: System message/系统消息
-        model: Model name, using default if None/模型名称，如果为None则使用默认模型
-        temperature: Temperature parameter/温度参数
-        streaming: Whether to use streaming generation, defaults to True/是否使用流式生成，默认为True
         chat_history: Chat history, will be limited to 5 most recent entries/聊天历史，将限制为最近5条
-        **kwargs: Additional parameters to pass to the LLM/其他传递给LLM的参数
         
     Returns:
-        Generated complete text/生成的完整文本
+        Messages in [{"role": ..., "content": ...}] format/消息列表
     """
-    llm_service = LLMServiceFactory.get_instance()
     # Start with system message
     messages = [{"role": "system", "content": system_message}]
     
@@ -43,15 +40,10 @@ async def generate_text(
     if chat_history and len(chat_history) > 0:
         # Read top intent and conversation history relevance from context variables
         skip_history = False
-        try:
-            from app.features.chat.router import get_current_intent
-            top_intent = get_current_intent()
-            if top_intent and hasattr(top_intent, 'additional_info') and top_intent.additional_info:
-                if top_intent.additional_info.get('conversation_history_relevance') == 'independent':
-                    skip_history = True
-        except (ImportError, AttributeError) as e:
-            # If there's any error accessing the intent, proceed with chat history
-            pass
+        top_intent = get_current_intent()
+        additional_info = getattr(top_intent, 'additional_info', None)
+        if isinstance(additional_info, dict) and additional_info.get('conversation_history_relevance') == 'independent':
+            skip_history = True
         
         if not skip_history:
             # Limit chat history to the 5 most recent entries
@@ -77,6 +69,35 @@ async def generate_text(
     # Add current user message
     messages.append({"role": "user", "content": prompt})
     
+    return messages
+
+async def generate_text(
+    prompt: str,
+    system_message: str = "You are a helpful assistant.",
+    model: Optional[str] = None,
+    temperature: float = 0.7,
+    streaming: bool = True,
+    chat_history: Optional[List[Dict[str, str]]] = [],
+    **kwargs
+) -> str:
+    """
+    Generate text using the LLM service
+    
+    Args:
+        prompt: User prompt/用户提示
+        system_message: System message/系统消息
+        model: Model name, using default if None/模型名称，如果为None则使用默认模型
+        temperature: Temperature parameter/温度参数
+        streaming: Whether to use streaming generation, defaults to True/是否使用流式生成，默认为True
+        chat_history: Chat history, will be limited to 5 most recent entries/聊天历史，将限制为最近5条
+        **kwargs: Additional parameters to pass to the LLM/其他传递给LLM的参数
+        
+    Returns:
+        Generated complete text/生成的完整文本
+    """
+    llm_service = LLMServiceFactory.get_instance()
+    messages = _build_messages(prompt, system_message, chat_history)
+    
     try:
         response = []
         async for chunk in llm_service.generate(
@@ -102,6 +123,45 @@ async def generate_text(
         logger.error(f"Error generating text: {str(e)}", exc_info=True)
         raise
 
+async def generate_structured(
+    prompt: str,
+    schema: Type[BaseModel],
+    system_message: str = "You are a helpful assistant.",
+    model: Optional[str] = None,
+    temperature: float = 0.0,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Generate a schema-constrained response using the LLM service's tool calling
+    
+    Args:
+        prompt: User prompt/用户提示
+        schema: Pydantic model describing the expected output/期望输出的Pydantic模型
+        system_message: System message/系统消息
+        model: Model name, using default if None/模型名称，如果为None则使用默认模型
+        temperature: Temperature parameter/温度参数
+        chat_history: Chat history, will be limited to 5 most recent entries/聊天历史，将限制为最近5条
+        **kwargs: Additional parameters to pass to the LLM/其他传递给LLM的参数
+        
+    Returns:
+        Plain dict matching the schema; validate it with the model before use/符合schema的字典
+    """
+    llm_service = LLMServiceFactory.get_instance()
+    messages = _build_messages(prompt, system_message, chat_history)
+    
+    try:
+        return await llm_service.generate_structured(
+            messages=messages,
+            schema=schema.model_json_schema(),
+            model=model,
+            temperature=temperature,
+            **kwargs
+        )
+    except Exception as e:
+        logger.error(f"Error generating structured output: {str(e)}", exc_info=True)
+        raise
+
 async def stream_text(
     messages: List[Dict[str, str]],
     model: Optional[str] = None,
@@ -0,0 +1,72 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.features.intent_analysis.services.fastpath import fastpath_classify
+
+class TestIntentFastpath(unittest.TestCase):
+    def test_greeting(self):
+        """Greetings are answered as question_only in the detected language"""
+        hit = fastpath_classify("  Hello! ")
+        self.assertEqual(hit["intent_type"], "question_only")
+        self.assertEqual(hit["additional_info"]["language"], "english")
+        self.assertEqual(fastpath_classify("你好")["additional_info"]["language"], "chinese")
+
+    def test_insert_image(self):
+        """Explicit image requests skip the LLM"""
+        self.assertEqual(fastpath_classify("Please add a picture of mountains")["intent_type"], "insert_image")
+        self.assertEqual(fastpath_classify("帮我插入一张山的图片")["intent_type"], "insert_image")
+
+    def test_read_file(self):
+        """Requests naming a document file are read_file"""
+        self.assertEqual(fastpath_classify("open report.pdf and summarize it")["intent_type"], "read_file")
+
+    def test_ambiguous_messages_fall_through(self):
+        """Anything that is not clearly trivial goes to the LLM"""
+        for message in [
+            "Write me a cover letter",
+            "create a presentation with images",
+            "生成一份带图片的PPT",
+            "hi, can you rewrite the introduction?",
+            "",
+        ]:
+            self.assertIsNone(fastpath_classify(message), message)
+
+    def test_image_edits_fall_through(self):
+        """Edits to an existing image are not new image requests"""
+        for message in [
+            "make the image bigger",
+            "make this diagram clearer",
+            "add image alt text to every figure",
+            "draw the flowchart again with fewer boxes",
+            "add a picture of mountains? no, rewrite the intro",
+            "插入图片的说明文字",
+        ]:
+            self.assertIsNone(fastpath_classify(message), message)
+
+    def test_image_of_document_content_falls_through(self):
+        """Image requests that refer to document content need the LLM for placement and context"""
+        for message in [
+            "add an image of our Q3 revenue table to section 2",
+            "make an image of the paragraph above",
+            "insert a diagram of the steps below",
+            "create a picture showing the previous chapter",
+            "add an illustration of the process here",
+            "帮我插入一张上面段落的配图",
+            "为表格生成一张示意图",
+        ]:
+            self.assertIsNone(fastpath_classify(message), message)
+
+    def test_file_edits_fall_through(self):
+        """A file name inside a longer edit request is not a read_file request"""
+        for message in [
+            "open the report.pdf? no wait, rewrite paragraph 2",
+            "open report.pdf and rewrite paragraph 2",
+        ]:
+            self.assertIsNone(fastpath_classify(message), message)
+
+if __name__ == '__main__':
+    unittest.main()
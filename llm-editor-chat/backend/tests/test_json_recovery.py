@@ -0,0 +1,44 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.json_recovery import parse_llm_json
+
+class TestParseLLMJson(unittest.TestCase):
+    def test_plain_json(self):
+        """Valid JSON responses are parsed directly"""
+        self.assertEqual(parse_llm_json('{"intent_type": "create_new", "confidence": 0.9}'),
+                         {"intent_type": "create_new", "confidence": 0.9})
+
+    def test_fenced_json_with_prose(self):
+        """JSON wrapped in a code fence and prose is recovered"""
+        text = 'Here you go:\n```json\n{"action": "replace", "additional_info": {"content": "a } b"}}\n```\nDone.'
+        self.assertEqual(parse_llm_json(text),
+                         {"action": "replace", "additional_info": {"content": "a } b"}})
+
+    def test_escaped_quotes_in_strings(self):
+        """Escaped quotes do not end a string early"""
+        text = 'prefix {"content": "say \\"{hi}\\""} suffix'
+        self.assertEqual(parse_llm_json(text), {"content": 'say "{hi}"'})
+
+    def test_multiple_objects(self):
+        """When the outer braces do not enclose one object, the first balanced object wins"""
+        self.assertEqual(parse_llm_json('{"a": 1} and then {"b": 2}'), {"a": 1})
+
+    def test_non_ascii_content(self):
+        """Byte-level slicing keeps multi-byte characters intact"""
+        self.assertEqual(
+            parse_llm_json('结果如下：{"language": "chinese", "welcome_message": "好的！"}'),
+            {"language": "chinese", "welcome_message": "好的！"}
+        )
+
+    def test_no_object(self):
+        """Responses without a JSON object yield an empty dict"""
+        self.assertEqual(parse_llm_json("no json here"), {})
+        self.assertEqual(parse_llm_json("[1, 2, 3]"), {})
+
+if __name__ == '__main__':
+    unittest.main()
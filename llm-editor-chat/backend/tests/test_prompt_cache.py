@@ -0,0 +1,65 @@
+import unittest
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.features.processing.prompt_cache import PromptOptimizationCache
+from app.utils.response_cache import SQLiteResponseCache
+
+class TestPromptOptimizationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = SQLiteResponseCache(Path(self.tmpdir.name) / "cache.db")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_exact_repeat_hits(self):
+        """The same prompt, up to whitespace and case, reuses the optimized prompt"""
+        cache = PromptOptimizationCache("aesthetic", "gpt-4o-mini", 0.0, cache=self.store)
+
+        async def run():
+            await cache.set("A red cat on a sofa", "optimized red cat")
+            return await cache.get("  a red  cat on a SOFA ")
+
+        self.assertEqual(asyncio.run(run()), "optimized red cat")
+
+    def test_similar_prompt_misses(self):
+        """A different subject never receives another prompt's result"""
+        cache = PromptOptimizationCache("aesthetic", "gpt-4o-mini", 0.0, cache=self.store)
+
+        async def run():
+            await cache.set("a red cat on a sofa", "optimized red cat")
+            return await cache.get("a blue cat on a sofa")
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_keyed_by_kind_and_model(self):
+        """Entries are not shared across image types or models"""
+        aesthetic = PromptOptimizationCache("aesthetic", "gpt-4o-mini", 0.0, cache=self.store)
+        diagram = PromptOptimizationCache("diagram", "gpt-4o-mini", 0.0, cache=self.store)
+        other_model = PromptOptimizationCache("aesthetic", "gpt-4o", 0.0, cache=self.store)
+
+        async def run():
+            await aesthetic.set("a cat", "optimized cat")
+            return await diagram.get("a cat"), await other_model.get("a cat")
+
+        self.assertEqual(asyncio.run(run()), (None, None))
+
+    def test_sampled_prompts_not_cached(self):
+        """Prompts optimized at a non-zero temperature keep their variety"""
+        cache = PromptOptimizationCache("aesthetic", "gpt-4o-mini", 0.7, cache=self.store)
+
+        async def run():
+            await cache.set("a red cat on a sofa", "optimized red cat")
+            return await cache.get("a red cat on a sofa")
+
+        self.assertIsNone(asyncio.run(run()))
+
+if __name__ == "__main__":
+    unittest.main()
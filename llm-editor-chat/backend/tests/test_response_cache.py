@@ -0,0 +1,55 @@
+import unittest
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.response_cache import SQLiteResponseCache
+
+class TestSQLiteResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "cache.db"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        """Stored token lists are returned unchanged"""
+        cache = SQLiteResponseCache(self.path)
+        cache.set("k", ["你好", "[ACTION]", "{}"])
+        self.assertEqual(cache.get("k"), ["你好", "[ACTION]", "{}"])
+        self.assertIsNone(cache.get("missing"))
+        cache.close()
+
+    def test_shared_across_instances(self):
+        """Entries persist on disk for other connections"""
+        SQLiteResponseCache(self.path).set("k", ["a"])
+        self.assertEqual(SQLiteResponseCache(self.path).get("k"), ["a"])
+
+    def test_ttl_expiry(self):
+        """Expired entries are treated as misses"""
+        cache = SQLiteResponseCache(self.path, ttl=0)
+        cache.set("k", ["a"])
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("k"))
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted beyond max_entries"""
+        cache = SQLiteResponseCache(self.path, max_entries=2)
+        cache.set("a", 1)
+        time.sleep(0.01)
+        cache.set("b", 2)
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+if __name__ == "__main__":
+    unittest.main()